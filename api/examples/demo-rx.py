@@ -3,9 +3,19 @@
 Read API data directly via internet and output to pipe
 """
 
-import sys, argparse, textwrap, requests, struct, json, logging, time, socket, \
-    errno, fcntl, datetime, math
+import os, sys, argparse, textwrap, struct, json, logging, time, \
+    socket, select, selectors, errno, fcntl, ctypes, ctypes.util, \
+    collections, concurrent.futures
+import certifi
 import sseclient
+import urllib3
+
+try:
+    # Use orjson (C implementation) to parse SSE events when available
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 
 # Constants/definitions
@@ -22,82 +32,412 @@ SIOCGIFINDEX       = 0x8933 # Ioctl request for interface index
 MAX_UDP_PLOAD      = 2**16 - 36 - 1 # maximum UDP payload size in bytes
 # NOTE: the maximum payload includes the Blocksat, UDP and IP headers. That is,
 # 8 (blocksat) + 8 (udp) + 20 (ip) = 36.
+UIO_MAXIOV         = 1024 # maximum batch size accepted by sendmmsg(2)
+SO_SNDBUF_SIZE     = 4 * 1024 * 1024 # socket send buffer size in bytes
+SO_ZEROCOPY        = getattr(socket, 'SO_ZEROCOPY', 60)
+MSG_ZEROCOPY       = getattr(socket, 'MSG_ZEROCOPY', 0x4000000)
+SO_EE_ORIGIN_ZEROCOPY = 5 # zero-copy completion origin on the error queue
+ZCOPY_THRESHOLD    = 16384 # minimum payload size for zero-copy transmission
+PREFETCH_DEPTH     = 4 # messages fetched concurrently during catch-up
+
+# File descriptors of sockets on which SO_ZEROCOPY could be enabled
+_zcopy_socks = set()
+
+# Debug-mode flag, snapshotted once in main(). Guarding the hot-loop debug
+# logs with this flag avoids evaluating their arguments when debug is off.
+_DEBUG = False
+
+# Month abbreviations used when formatting event timestamps
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+           'Oct', 'Nov', 'Dec')
+
+
+def _fmt_timestamp(ts):
+    """Format an ISO 8601 API timestamp for printing
 
+    Produces the same "%b %d %Y %H:%M:%S" form previously obtained with a
+    strptime/strftime pair, but by slicing the fixed-width ISO string
+    directly, avoiding the costly (regex-based) strptime call per event.
 
-def packetize(data, seq_num):
+    Args:
+        ts : Timestamp string formatted as "YYYY-MM-DDTHH:MM:SS.ffffffZ"
+
+    """
+    return "%s %s %s %s" %(_MONTHS[int(ts[5:7]) - 1], ts[8:10], ts[:4],
+                           ts[11:19])
+
+# Pre-compiled header struct, so that the format string is parsed only once
+# rather than on every fragment
+_HDR      = struct.Struct(HEADER_FORMAT)
+_HDR_SIZE = _HDR.size
+
+# Pre-compiled ip_mreqn struct used on socket setup
+_MREQN    = struct.Struct('4s4si')
+
+# Pool of reusable header buffers, one per packet of a send batch. Headers are
+# packed in place instead of allocating a fresh bytes object per fragment. A
+# buffer is only recycled once the batch containing it has been flushed, which
+# holds because the pool is as large as the send batch (UIO_MAXIOV).
+_HDR_POOL = [bytearray(_HDR_SIZE) for _ in range(UIO_MAXIOV)]
+
+
+# ctypes definitions used to call sendmmsg(2), which is not wrapped by the
+# socket module. Structures follow the Linux definitions.
+class _Iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+
+class _Msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(_Iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+
+class _Mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _Msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+
+class _PyBuffer(ctypes.Structure):
+    """CPython Py_buffer, used to get the address of a buffer without copy"""
+    _fields_ = [("buf", ctypes.c_void_p),
+                ("obj", ctypes.py_object),
+                ("len", ctypes.c_ssize_t),
+                ("itemsize", ctypes.c_ssize_t),
+                ("readonly", ctypes.c_int),
+                ("ndim", ctypes.c_int),
+                ("format", ctypes.c_char_p),
+                ("shape", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("strides", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("suboffsets", ctypes.POINTER(ctypes.c_ssize_t)),
+                ("internal", ctypes.c_void_p)]
+
+
+try:
+    _libc          = ctypes.CDLL(ctypes.util.find_library("c"),
+                                 use_errno=True)
+    _libc_sendmmsg = _libc.sendmmsg
+except (OSError, AttributeError):
+    _libc_sendmmsg = None
+
+
+def packetize(chunks, msg_len, seq_num):
     """Place data into Blocksat Packet(s)
 
     An API message may be sent over multiple packet in case its length exceeds
-    the maximum UDP payload.
+    the maximum UDP payload. This generator consumes the message data chunk by
+    chunk as it arrives from the streamed HTTP download, so that the first
+    packets can go out before the download completes.
 
     Args:
-        data    : Bytes object containing the API message data
+        chunks  : Iterable of bytes objects carrying the API message data
+        msg_len : Total length of the API message in bytes
         seq_num : API Tx sequence number (`tx_seq_num` field)
 
-    Returns:
-        List of Blocksat packets that will convey the given API message, each
-        one being a Bytes object.
+    Yields:
+        Blocksat packets that will convey the given API message, each one
+        being a (header, payload) pair of buffers. The two buffers are kept
+        separate so that the send path can gather them on a single datagram
+        (via iovecs) without concatenating, i.e. without copying the payload.
 
     """
-    assert(isinstance(data, bytes))
-    n_frags = math.ceil(len(data) / MAX_UDP_PLOAD)
-    pkts    = list()
+    # Fast path for the dominant case: the message fits in one fragment, so
+    # skip the fragment-loop machinery altogether
+    if (msg_len <= MAX_UDP_PLOAD):
+        if (_DEBUG):
+            logging.debug("Message size: %d bytes\tFragments: 1", msg_len)
+
+        header = _HDR_POOL[0]
+        _HDR.pack_into(header, 0, API_TYPE_LAST_FRAG, 0, seq_num)
+
+        # The download normally delivers a single chunk here. The join is a
+        # no-op for one chunk and only concatenates if a chunked response
+        # split the body into smaller pieces.
+        yield (header, b''.join(chunks))
+        return
+
+    # Ceiling division in pure integer arithmetic (no float rounding risk)
+    n_frags = (msg_len + MAX_UDP_PLOAD - 1) // MAX_UDP_PLOAD
+
+    if (_DEBUG):
+        logging.debug("Message size: %d bytes\tFragments: %d", msg_len,
+                      n_frags)
+
+    # Cache globals as locals to avoid repeated lookups in the loop
+    pack_hdr  = _HDR.pack_into
+    hdr_pool  = _HDR_POOL
+    last_frag = API_TYPE_LAST_FRAG
+    more_frag = API_TYPE_MORE_FRAG
+
+    n_bytes = 0
+    for i_frag, chunk in enumerate(chunks):
+        # Assert more fragments (MF) bit if this isn't the last fragment
+        n_bytes += len(chunk)
+        octet_0  = last_frag if (n_bytes == msg_len) else more_frag
 
-    logging.debug("Message size: %d bytes\tFragments: %d" %(len(data), n_frags))
+        # Pack the header in place on a recycled buffer
+        header = hdr_pool[i_frag % UIO_MAXIOV]
+        pack_hdr(header, 0, octet_0, i_frag, seq_num)
+        yield (header, chunk)
 
-    for i_frag in range(n_frags):
-        # Assert more fragments (MF) bit if this isn't the last fragment
-        octet_0 = API_TYPE_LAST_FRAG if ((i_frag + 1) == n_frags) else \
-                  API_TYPE_MORE_FRAG
-        header  = struct.pack(HEADER_FORMAT, octet_0, i_frag, seq_num)
 
-        # Byte range of the data to send on this Blocksat packet
-        s_byte  = i_frag * MAX_UDP_PLOAD # starting byte
-        e_byte  = (i_frag + 1) * MAX_UDP_PLOAD # ending byte
-        pkt     = header + data[s_byte:e_byte]
-        pkts.append(pkt)
+def _wait_writable(sock):
+    """Wait until the given non-blocking socket can take more data
+
+    Uses the default selector (epoll on Linux), so a send that fills the
+    socket buffer defers until the kernel drains it instead of blocking the
+    event loop inside the send syscall.
+
+    """
+    with selectors.DefaultSelector() as sel:
+        sel.register(sock, selectors.EVENT_WRITE)
+        sel.select()
+
 
-    return pkts
+def _reap_zcopy_completions(sock, n_expected):
+    """Reap MSG_ZEROCOPY completion notifications from the error queue
 
+    With zero-copy transmission, the kernel may still read the packet buffers
+    after sendmmsg returns, so the buffers can only be released once the
+    completion notifications covering all zero-copy sends have arrived. Each
+    notification carries a range of completed transmissions in the ee_info /
+    ee_data fields of a sock_extended_err structure.
 
-def send_pkts(socks, pkts, ip, port):
+    Args:
+        sock       : Socket whose error queue should be drained
+        n_expected : Number of zero-copy transmissions to wait for
+
+    """
+    n_done   = 0
+    deadline = time.time() + 2.0
+
+    while (n_done < n_expected and time.time() < deadline):
+        try:
+            _, ancdata, _, _ = sock.recvmsg(0, 512, socket.MSG_ERRQUEUE)
+        except (BlockingIOError, InterruptedError):
+            # No notification yet - wait for error-queue activity
+            select.select([sock], [], [sock], 0.1)
+            continue
+
+        for cmsg_level, cmsg_type, cmsg_data in ancdata:
+            # struct sock_extended_err
+            ee = struct.unpack_from('=IBBBBII', cmsg_data)
+            if (ee[1] == SO_EE_ORIGIN_ZEROCOPY):
+                n_done += ee[6] - ee[5] + 1
+
+    if (n_done < n_expected):
+        # The kernel may still be reading the pending buffers, which the
+        # caller releases on return. Stop using zero-copy on this socket
+        # rather than risking corrupted payloads again.
+        logging.warning("Timed out waiting for %d of %d zero-copy "
+                        "completions - disabling zero-copy",
+                        n_expected - n_done, n_expected)
+        _zcopy_socks.discard(sock.fileno())
+
+
+def _sendmmsg(sock, pkts):
+    """Send a batch of packets on a single sendmmsg(2) syscall
+
+    Builds one mmsghdr per packet and hands the entire batch to the kernel at
+    once, which amortizes the per-packet syscall overhead of a send loop. The
+    socket is connected to the destination beforehand, so no per-packet
+    sockaddr is supplied. Each packet is a (header, payload) pair of buffers,
+    fed to the kernel as two iovec entries so that the gather happens on the
+    kernel side, without ever concatenating (copying) header and payload in
+    user space.
+
+    Args:
+        sock : Connected socket over which to send the packets
+        pkts : List of (header, payload) packets to be sent
+
+    Returns:
+        True when the batch was sent via sendmmsg, False when sendmmsg is
+        unavailable and the caller should fall back to per-packet sends.
+
+    """
+    if (_libc_sendmmsg is None):
+        return False
+
+    # NOTE: a compiled (C/Cython) extension could run this loop entirely in C,
+    # but this example ships as a plain script without a build step. The
+    # ctypes path below keeps the per-packet work down to filling the iovec
+    # and mmsghdr arrays, while the syscall batching does the heavy lifting.
+    n_pkts  = len(pkts)
+    iovecs  = (_Iovec * (2 * n_pkts))()
+    msgvec  = (_Mmsghdr * n_pkts)()
+    py_bufs = (_PyBuffer * (2 * n_pkts))()
+
+    # Cache the ctypes helpers as locals for the loop below
+    get_buffer = ctypes.pythonapi.PyObject_GetBuffer
+    py_object  = ctypes.py_object
+    byref      = ctypes.byref
+    pointer    = ctypes.pointer
+
+    try:
+        for i, (header, payload) in enumerate(pkts):
+            # Get the base address of the header and payload buffers through
+            # the buffer protocol, without copying either of them
+            get_buffer(py_object(header), byref(py_bufs[2*i]), 0)
+            get_buffer(py_object(payload), byref(py_bufs[2*i+1]), 0)
+
+            iovecs[2*i].iov_base   = py_bufs[2*i].buf
+            iovecs[2*i].iov_len    = py_bufs[2*i].len
+            iovecs[2*i+1].iov_base = py_bufs[2*i+1].buf
+            iovecs[2*i+1].iov_len  = py_bufs[2*i+1].len
+
+            hdr                 = msgvec[i].msg_hdr
+            hdr.msg_iov         = pointer(iovecs[2*i])
+            hdr.msg_iovlen      = 2
+
+        # Use zero-copy transmission for large payloads, so that the kernel
+        # pins the user pages instead of copying each ~64 KB fragment
+        zcopy = (sock.fileno() in _zcopy_socks) and \
+                (py_bufs[1].len >= ZCOPY_THRESHOLD)
+        flags = MSG_ZEROCOPY if zcopy else 0
+
+        n_sent  = 0
+        n_zcopy = 0
+        while (n_sent < n_pkts):
+            vlen = min(n_pkts - n_sent, UIO_MAXIOV)
+            res  = _libc_sendmmsg(sock.fileno(), ctypes.byref(msgvec[n_sent]),
+                                  vlen, flags)
+            if (res < 0):
+                err = ctypes.get_errno()
+                if (err == errno.ENOSYS and n_sent == 0):
+                    return False
+                if (err in (errno.EAGAIN, errno.EWOULDBLOCK)):
+                    # Socket buffer full - wait for writability and resume
+                    _wait_writable(sock)
+                    continue
+                if (zcopy and err in (errno.ENOBUFS, errno.EINVAL)):
+                    # Zero-copy failure (e.g. no UDP support on this kernel
+                    # or locked-pages limit). Retry with regular copies.
+                    _zcopy_socks.discard(sock.fileno())
+                    zcopy = False
+                    flags = 0
+                    continue
+                raise OSError(err, os.strerror(err))
+            n_sent += res
+            if (zcopy):
+                n_zcopy += res
+
+        # The payload buffers are released below, so any zero-copy
+        # transmission must be completed first
+        if (n_zcopy > 0):
+            _reap_zcopy_completions(sock, n_zcopy)
+    finally:
+        for py_buf in py_bufs:
+            if (py_buf.buf):
+                ctypes.pythonapi.PyBuffer_Release(ctypes.byref(py_buf))
+
+    return True
+
+
+def _send_batch(socks, pkts):
+    """Send a batch of Blocksat packets over each of the given sockets
+
+    NOTE: UDP generic segmentation offload (UDP_SEGMENT) was considered as an
+    alternative to sendmmsg here, but it does not apply: a GSO send takes at
+    most 64 KB and splits it into equal-sized datagrams, while the Blocksat
+    fragments produced by packetize are already ~64 KB datagrams themselves.
+    One GSO send could carry at most a single fragment, so batching the
+    fragments on one sendmmsg call remains the right tool.
+
+    """
+    for sock in socks:
+        if (_sendmmsg(sock, pkts)):
+            if (_DEBUG):
+                logging.debug("Sent %d packets on a single syscall",
+                              len(pkts))
+            continue
+
+        # Fall back to one sendmsg syscall per packet. The header and payload
+        # buffers still get gathered by the kernel, without a user-space copy.
+        # The socket is connected, so no destination tuple gets re-parsed per
+        # packet; bind the send method to a local for the same reason.
+        sendmsg = sock.sendmsg
+        for i, (header, payload) in enumerate(pkts):
+            while (True):
+                try:
+                    sendmsg([header, payload])
+                    break
+                except BlockingIOError:
+                    # Socket buffer full - wait for writability and retry
+                    _wait_writable(sock)
+            if (_DEBUG):
+                logging.debug("Send packet %d - %d bytes", i,
+                              len(header) + len(payload))
+
+
+def send_pkts(socks, pkts):
     """Send Blocksat packets corresponding to one API message
 
+    Packets are consumed from the given iterator and sent in batches of up to
+    UIO_MAXIOV, so that the transmission overlaps with the streamed download
+    producing the packets. The sockets are already connected to the
+    destination address, so the kernel skips the per-packet destination
+    handling that sendto would incur.
+
     Args:
-        pkts : List of Blocksat packet structures to be sent
-        ip   : Destination IP address
-        port : Destination UDP port
+        pkts : Iterator of Blocksat packets to be sent
 
     """
-    assert(isinstance(pkts, list))
     assert(isinstance(socks, list))
 
-    for i, pkt in enumerate(pkts):
-        for sock in socks:
-            sock.sendto(pkt, (ip, port))
-            logging.debug("Send packet %d - %d bytes" %(
-                i, len(pkt)))
+    batch  = list()
+    append = batch.append
+    for pkt in pkts:
+        append(pkt)
+        if (len(batch) == UIO_MAXIOV):
+            _send_batch(socks, batch)
+            batch.clear()
+
+    if (batch):
+        _send_batch(socks, batch)
 
 
-def fetch_api_data(server_addr, seq_num):
+def fetch_api_data(http, server_addr, seq_num):
     """Download a given message from the Satellite API
 
+    Streams the HTTP response body in MAX_UDP_PLOAD-sized chunks instead of
+    buffering the entire message, so that peak memory stays bounded by the
+    chunk size and transmission can start before the download completes.
+
     Args:
+        http        : Pool manager holding persistent (keep-alive)
+                      connections to the API server
         server_addr : Satellite API server address
         seq_num     : Message sequence number
 
     Returns:
-        Message data as sequence of bytes
+        Tuple with the message length and an iterator over the chunks of
+        message data, each chunk being a bytes object
 
     """
-    logging.debug("Fetch message #%s from API" %(seq_num))
-    r = requests.get(server_addr + '/message/' + str(seq_num))
+    if (_DEBUG):
+        logging.debug("Fetch message #%s from API", seq_num)
+    r = http.request('GET', server_addr + '/message/' + str(seq_num),
+                     preload_content=False)
+
+    if (r.status != 200):
+        r.release_conn()
+        raise urllib3.exceptions.HTTPError(
+            "Failed to fetch message %d (status %d)" %(seq_num, r.status))
 
-    r.raise_for_status()
+    if ('Content-Length' in r.headers):
+        msg_len = int(r.headers['Content-Length'])
+        return (msg_len, r.stream(MAX_UDP_PLOAD))
 
-    if (r.status_code == requests.codes.ok):
-        data        = r.content
-        return data
+    # Without a Content-Length, buffer the message to find its size
+    data = r.read()
+    return (len(data),
+            (data[i:i+MAX_UDP_PLOAD]
+             for i in range(0, len(data), MAX_UDP_PLOAD)))
 
 
 def open_sock(ifname, port, multiaddr, ttl=1, dscp=0):
@@ -110,7 +450,7 @@ def open_sock(ifname, port, multiaddr, ttl=1, dscp=0):
 
     """
     assert(ttl <= 255)
-    logging.debug("Open socket to interface {}".format(ifname))
+    logging.debug("Open socket to interface %s", ifname)
 
     # Open output socket
     sock = socket.socket(socket.AF_INET,
@@ -120,6 +460,19 @@ def open_sock(ifname, port, multiaddr, ttl=1, dscp=0):
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     sock.bind(('', port))
 
+    # Enlarge the send buffer so that bursts of large fragmented messages do
+    # not stall on SO_SNDBUF exhaustion
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SO_SNDBUF_SIZE)
+
+    # Enable zero-copy transmission where available (Linux >= 5.0 for UDP).
+    # Whether it is actually used is decided per batch, based on the payload
+    # size, since pinning pages only pays off for large fragments.
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_ZEROCOPY, 1)
+        _zcopy_socks.add(sock.fileno())
+    except OSError:
+        pass
+
     # Get index of target interface
     if (ifname is not None):
         ifreq    = struct.pack('16si', ifname.encode(), 0)
@@ -129,23 +482,32 @@ def open_sock(ifname, port, multiaddr, ttl=1, dscp=0):
         ifindex  = 0
 
     # Define the interface over which to send the multicast messages
-    ip_mreqn = struct.pack('4s4si',
-                           socket.inet_aton(multiaddr),
+    ip_mreqn = _MREQN.pack(socket.inet_aton(multiaddr),
                            socket.inet_aton('0.0.0.0'),
                            ifindex)
     sock.setsockopt(socket.IPPROTO_IP,
                     socket.IP_MULTICAST_IF,
                     ip_mreqn)
 
-    # Set multicast TTL
+    # Set multicast TTL. The socket module accepts a plain int here, so no
+    # struct packing is needed.
     sock.setsockopt(socket.IPPROTO_IP,
                     socket.IP_MULTICAST_TTL,
-                    struct.pack('b', ttl))
+                    ttl)
 
     # Set DSCP
     sock.setsockopt(socket.IPPROTO_IP,
                     socket.IP_TOS,
-                    struct.pack('b', dscp))
+                    dscp)
+
+    # Connect to the (fixed) destination address, so that packets can be
+    # transmitted with send() instead of sendto(). On a connected UDP socket
+    # the kernel resolves the route once instead of on every packet.
+    sock.connect((multiaddr, port))
+
+    # Non-blocking, so a full send buffer defers the transmission (see
+    # _wait_writable) rather than stalling the SSE event loop
+    sock.setblocking(False)
 
     return sock
 
@@ -213,17 +575,14 @@ def main():
     net    = args.net
 
     # Switch debug level
+    global _DEBUG
+    _DEBUG = args.debug
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        datefmt='%b %d %Y %H:%M:%S',
+        level=logging.DEBUG if args.debug else logging.INFO)
     if (args.debug):
-        logging.basicConfig(
-            format='%(asctime)s %(levelname)-8s %(message)s',
-            datefmt='%b %d %Y %H:%M:%S',
-            level=logging.DEBUG)
         logging.debug('[Debug Mode]')
-    else:
-        logging.basicConfig(
-            format='%(asctime)s %(levelname)-8s %(message)s',
-            datefmt='%b %d %Y %H:%M:%S',
-            level=logging.INFO)
 
     # Parse the server address
     if (net is not None and net == "main"):
@@ -244,7 +603,7 @@ def main():
     dest_port              = int(dest_port_str)
     assert(dest_ip is not None), "UDP source IP is not defined"
     assert(dest_port is not None), "UDP port is not defined"
-    logging.debug("Send Satellite API packets to %s:%s" %(dest_ip, dest_port))
+    logging.debug("Send Satellite API packets to %s:%s", dest_ip, dest_port)
 
     # Open sockets. Create one socket per interface and DSCP. For example, if
     # two DSCPs are specified, launch two sockets for each interface.
@@ -259,80 +618,110 @@ def main():
     # Always keep a record of the last received sequence number
     last_seq_num = None
 
+    # Persistent HTTP connection pool, reused both for the SSE stream and
+    # for the message downloads. Keep-alive avoids a fresh TCP+TLS handshake
+    # per fetched message, which matters on bursty catch-up loops, and the
+    # pool serves the concurrent prefetch threads.
+    http = urllib3.PoolManager(cert_reqs='CERT_REQUIRED',
+                               ca_certs=certifi.where(),
+                               maxsize=PREFETCH_DEPTH,
+                               block=False)
+
+    # Bounded thread pool used to prefetch messages during catch-up, so that
+    # the downloads overlap with the UDP transmission instead of serializing
+    # one fetch per transmitted message
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=PREFETCH_DEPTH)
+
     print("Connecting with Satellite API server...")
     while (True):
         try:
             # Server-sent Events (SSE) Client
-            r = requests.get(server_addr + "/subscribe/transmissions",
-                             stream=True)
-            r.raise_for_status()
+            r = http.request('GET',
+                             server_addr + "/subscribe/transmissions",
+                             preload_content=False)
+            if (r.status != 200):
+                raise urllib3.exceptions.HTTPError(
+                    "Subscription failed (status %d)" %(r.status))
             client = sseclient.SSEClient(r)
             print("Connected. Waiting for events...\n")
 
             # Continuously wait for events
             for event in client.events():
                 # Parse the order corresponding to the event
-                order = json.loads(event.data)
+                order = _json_loads(event.data)
 
-                # Debug
-                logging.debug("Order: " + json.dumps(order, indent=4,
-                                                     sort_keys=True))
+                # Debug. Only serialize the order when debug is active, since
+                # the pretty-printed dump is expensive.
+                if (_DEBUG):
+                    logging.debug("Order: %s", json.dumps(order, indent=4,
+                                                    sort_keys=True))
 
                 # Download the message only if its order has "sent" state
                 if (order["status"] == args.event):
                     # Sequence number
                     seq_num = order["tx_seq_num"]
 
-                    rx_pending = True
-                    while (rx_pending):
-                        # Receive all messages until caught up
-                        if (last_seq_num is None):
-                            expected_seq_num = seq_num
-                        else:
-                            expected_seq_num = last_seq_num + 1
+                    # Receive all messages until caught up
+                    if (last_seq_num is None):
+                        first_seq_num = seq_num
+                    else:
+                        first_seq_num = last_seq_num + 1
+
+                    # Prefetch the pending messages on the thread pool, up to
+                    # a bounded pipeline depth, and drain them in order into
+                    # the UDP transmission below
+                    fetches    = collections.deque()
+                    next_fetch = first_seq_num
+                    for expected_seq_num in range(first_seq_num, seq_num + 1):
+                        while (next_fetch <= seq_num and
+                               len(fetches) < PREFETCH_DEPTH):
+                            fetches.append(
+                                executor.submit(fetch_api_data, http,
+                                                server_addr, next_fetch))
+                            next_fetch += 1
 
                         # Is this an interation to catch up with a sequence
                         # number gap or a normal transmission iteration?
-                        if (seq_num == expected_seq_num):
-                            rx_pending = False
-                        else:
-                            logging.info("Catch up with transmission %d" %(
-                                expected_seq_num))
+                        if (seq_num != expected_seq_num):
+                            logging.info("Catch up with transmission %d",
+                                         expected_seq_num)
 
                         # Log
                         tstamp_field = "started_transmission_at" if \
                                        args.event == "transmitting" else \
                                        "ended_transmission_at"
-                        timestamp = datetime.datetime.strptime(
-                            order[tstamp_field], "%Y-%m-%dT%H:%M:%S.%fZ")
-
                         print("%s Message #%-5d\tSize: %d bytes\t" %(
-                            timestamp.strftime('%b %d %Y %H:%M:%S'),
+                            _fmt_timestamp(order[tstamp_field]),
                             expected_seq_num, order["message_size"]))
 
                         # Get the data
-                        data = fetch_api_data(server_addr, expected_seq_num)
+                        ret = fetches.popleft().result()
+
+                        if (ret is not None):
+                            msg_len, chunks = ret
 
-                        if (data is not None):
-                            # Put API data on Blocksat packet(s)
-                            pkts = packetize(data, expected_seq_num)
+                            # Put API data on Blocksat packet(s) as the
+                            # chunks arrive from the streamed download
+                            pkts = packetize(chunks, msg_len,
+                                             expected_seq_num)
 
                             # Send the packet(s)
-                            send_pkts(socks, pkts, dest_ip, dest_port)
+                            send_pkts(socks, pkts)
 
                         # Record the sequence number of the order that was received
                         last_seq_num = expected_seq_num
 
-        except requests.exceptions.ChunkedEncodingError as e:
+        except urllib3.exceptions.ProtocolError as e:
             logging.debug(e)
             pass
 
-        except requests.exceptions.ConnectionError as e:
+        except urllib3.exceptions.MaxRetryError as e:
             logging.debug(e)
             time.sleep(2)
             pass
 
-        except requests.exceptions.RequestException as e:
+        except urllib3.exceptions.HTTPError as e:
             logging.debug(e)
             time.sleep(2)
             pass
@@ -6,6 +6,21 @@ from . import util, defs, instructions
 import textwrap
 from decimal import Decimal, getcontext
 
+# orjson is an optional dependency that speeds up JSON parsing and
+# serialization of the configuration file. Fall back to the standard library
+# when it is not installed.
+try:
+    import orjson
+    def _json_loads(data):
+        return orjson.loads(data)
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+    def _json_dumps(obj):
+        return json.dumps(obj)
+
 
 def _cfg_satellite():
     """Configure satellite covering the user"""
@@ -328,7 +343,7 @@ def _read_cfg_file(cfg_file):
 
     if (os.path.isfile(cfg_file)):
         with open(cfg_file) as fd:
-            info = json.load(fd)
+            info = _json_loads(fd.read())
         return info
 
 
@@ -411,7 +426,7 @@ def configure(args):
         os.makedirs(args.cfg_dir)
 
     with open(cfg_file, 'w') as fd:
-        json.dump(user_info, fd)
+        fd.write(_json_dumps(user_info))
 
     util._print_header("JSON configuration file")
     print("Saved configurations on %s" %(cfg_file))
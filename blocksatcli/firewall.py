@@ -1,13 +1,54 @@
 """Configure Firewall Rules"""
 import subprocess, logging, os
 from argparse import ArgumentDefaultsHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
 from . import util, defs
 
+# Invariant argv of the iptables listing command. Kept as a tuple and copied
+# on use, since util.root_cmd inserts "sudo" into the list in place.
+IPTABLES_LIST_CMD = ("iptables", "-w", "-L", "-v", "--line-numbers")
 
-def _get_iptables_rules(net_if):
+
+def _udp_rule_cmd(net_if, ports):
+    """Build the iptables command that accepts Blocksat traffic"""
+    return util.root_cmd([
+        "iptables", "-w",
+        "-I", "INPUT",
+        "-p", "udp",
+        "-i", net_if,
+        "--match", "multiport",
+        "--dports", ",".join(ports),
+        "-j", "ACCEPT",
+    ])
+
+
+def _igmp_rule_cmd(net_if):
+    """Build the iptables command that accepts IGMP queries"""
+    return util.root_cmd([
+        "iptables", "-w",
+        "-I", "INPUT",
+        "-p", "igmp",
+        "-i", net_if,
+        "-j", "ACCEPT",
+    ])
+
+
+def _list_iptables_rules():
+    """List the current iptables rules
+
+    Returns:
+        Raw output (bytes) of the iptables list command
+
+    """
+    cmd = util.root_cmd(list(IPTABLES_LIST_CMD))
+    return subprocess.check_output(cmd)
+
+
+def _get_iptables_rules(res, net_if):
     """Get iptables rules that are specifically applied to a target interface
 
     Args:
+        res    : Cached output of the iptables list command
         net_if : network interface name
 
     Returns:
@@ -15,26 +56,22 @@ def _get_iptables_rules(net_if):
 
     """
 
-
-
-    # Get rules
-    cmd = util.root_cmd(["iptables", "-L", "-v", "--line-numbers"])
-    res = subprocess.check_output(cmd)
-
     # Parse
     header1 = ""
     header2 = ""
     rules   = list()
     for line in res.splitlines():
-        if ("Chain INPUT" in line.decode()):
-            header1 = line.decode()
+        # Decode each line only once
+        s = line.decode()
+        if ("Chain INPUT" in s):
+            header1 = s
 
-        if ("destination" in line.decode()):
-            header2 = line.decode()
+        if ("destination" in s):
+            header2 = s
 
-        if (net_if in line.decode()):
+        if (net_if in s):
             rules.append({
-                'rule' : line.decode().split(),
+                'rule' : s.split(),
                 'header1' : header1,
                 'header2' : header2
             })
@@ -42,58 +79,31 @@ def _get_iptables_rules(net_if):
     return rules
 
 
-def _is_iptables_igmp_rule_set(net_if, cmd):
-    """Check if an iptables rule for IGMP is already configured
-
-    Args:
-        net_if : network interface name
-        cmd    : list with iptables command
-
-    Returns:
-        True if rule is already set, False otherwise.
-
-    """
-    offset = 1 if cmd[0] == "sudo" else 0
+def _is_rule_set(cmd):
+    """Check if an iptables rule is already configured
 
-    for rule in _get_iptables_rules(net_if):
-        if (rule['rule'][3] == "ACCEPT" and
-            rule['rule'][6] == cmd[6 + offset] and
-            rule['rule'][4] == "igmp"):
-            print("\nFirewall rule for IGMP already configured\n")
-            print(rule['header1'])
-            print(rule['header2'])
-            print(" ".join(rule['rule']))
-            print("\nSkipping...")
-            return True
-
-    return False
-
-
-def _is_iptables_udp_rule_set(net_if, cmd):
-    """Check if an iptables rule for UDP is already configured
+    Uses iptables -C, which queries the kernel for an exact rule match
+    instead of listing and parsing the full rule table. The commands
+    carry -w, so concurrent checks wait for the xtables lock instead of
+    failing.
 
     Args:
-        net_if : network interface name
-        cmd    : list with iptables command
+        cmd : list with the iptables insert command for the rule
 
     Returns:
         True if rule is already set, False otherwise.
 
     """
-    offset = 1 if cmd[0] == "sudo" else 0
-    for rule in _get_iptables_rules(net_if):
-        if (rule['rule'][3] == "ACCEPT" and
-            rule['rule'][6] == cmd[6 + offset] and
-            (rule['rule'][4] == "udp" and
-             rule['rule'][12] == cmd[10 + offset])):
-            print("\nFirewall rule already configured\n")
-            print(rule['header1'])
-            print(rule['header2'])
-            print(" ".join(rule['rule']))
-            print("\nSkipping...")
-            return True
-
-    return False
+    check_cmd = [("-C" if (arg == "-I") else arg) for arg in cmd]
+    res = subprocess.run(check_cmd, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL)
+    if (res.returncode not in (0, 1)):
+        # Anything other than a clean hit (0) or miss (1) means the check
+        # itself failed. Report it and assume the rule is missing, in which
+        # case the user is still prompted before any insertion.
+        logging.warning("Failed to check iptables rule (status %d)",
+                        res.returncode)
+    return (res.returncode == 0)
 
 
 def _add_iptables_rule(net_if, cmd):
@@ -104,13 +114,16 @@ def _add_iptables_rule(net_if, cmd):
         cmd    : list with iptables command
 
     """
-    offset = 1 if cmd[0] == "sudo" else 0
+    # Index of "-w" in cmd, which also accounts for the optional leading
+    # "sudo". The rule fields below are located relative to it.
+    offset = cmd.index("-w")
 
     # Set up iptables rules
     logging.debug("> " + " ".join(cmd))
-    subprocess.check_output(cmd)
+    util.run_cmd(cmd)
 
-    for rule in _get_iptables_rules(net_if):
+    # Re-list the rules to verify and print the rule just added
+    for rule in _get_iptables_rules(_list_iptables_rules(), net_if):
         print_rule = False
 
         if (rule['rule'][3] == "ACCEPT" and
@@ -129,31 +142,29 @@ def _add_iptables_rule(net_if, cmd):
                 print(" ".join(rule['rule']) + "\n")
 
 
-def _configure_firewall(net_if, ports, igmp=False, prompt=True):
+def _configure_firewall(net_if, ports, igmp=False, prompt=True,
+                        udp_set=None, igmp_set=None):
     """Configure firewallrules to accept blocksat traffic via DVB interface
 
     Args:
-        net_if : DVB network interface name
-        ports  : ports used for blocks traffic and API traffic
-        igmp   : Whether or not to configure rule to accept IGMP queries
+        net_if   : DVB network interface name
+        ports    : ports used for blocks traffic and API traffic
+        igmp     : Whether or not to configure rule to accept IGMP queries
+        udp_set  : Pre-computed result of the UDP rule check, if available
+        igmp_set : Pre-computed result of the IGMP rule check, if available
 
     """
 
     not_root = (os.geteuid() != 0)
 
-    cmd = util.root_cmd([
-        "iptables",
-        "-I", "INPUT",
-        "-p", "udp",
-        "-i", net_if,
-        "--match", "multiport",
-        "--dports", ",".join(ports),
-        "-j", "ACCEPT",
-    ])
+    cmd = _udp_rule_cmd(net_if, ports)
 
     if (not_root):
         print(" ".join(cmd))
-    elif (not _is_iptables_udp_rule_set(net_if, cmd)):
+    elif (udp_set if udp_set is not None else _is_rule_set(cmd)):
+        print("\nFirewall rule already configured\n")
+        print("Skipping...")
+    else:
         print("- Configure firewall rule to accept Blocksat traffic arriving " +
               "at interface %s\ntowards UDP ports %s." %(net_if, ",".join(ports)))
         if ((not prompt) or
@@ -172,17 +183,14 @@ def _configure_firewall(net_if, ports, igmp=False, prompt=True):
     # switches between itself and the DVB demodulator to continue delivering the
     # multicast-addressed traffic. This overcomes the scenario where group
     # membership timeouts are implemented by the intermediate switches.
-    cmd = util.root_cmd([
-        "iptables",
-        "-I", "INPUT",
-        "-p", "igmp",
-        "-i", net_if,
-        "-j", "ACCEPT",
-    ])
+    cmd = _igmp_rule_cmd(net_if)
 
     if (not_root):
         print(" ".join(cmd))
-    elif (not _is_iptables_igmp_rule_set(net_if, cmd)):
+    elif (igmp_set if igmp_set is not None else _is_rule_set(cmd)):
+        print("\nFirewall rule for IGMP already configured\n")
+        print("Skipping...")
+    else:
         print("Configure also a firewall rule to accept IGMP queries. This is " +
               "necessary when using a standalone DVB demodulator.")
         if ((not prompt) or
@@ -205,12 +213,29 @@ def configure(net_ifs, ports, igmp=False, prompt=True):
     print("\n------------------------------- Firewall Rules " +
           "---------------------------------")
 
-    if (os.geteuid() != 0):
+    is_root = (os.geteuid() == 0)
+    if (not is_root):
         util.fill_print("Please run blocksat-cli as root or run the following \
         commands on your own:\n")
 
+    # Run the read-only rule checks for all interfaces in parallel. The
+    # modifying calls stay serialized on the loop below, since iptables holds
+    # the xtables lock while changing rules.
+    udp_checks  = [None] * len(net_ifs)
+    igmp_checks = [None] * len(net_ifs)
+    if (is_root and len(net_ifs) > 1):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            udp_checks = list(executor.map(
+                lambda net_if : _is_rule_set(_udp_rule_cmd(net_if, ports)),
+                net_ifs))
+            if (igmp):
+                igmp_checks = list(executor.map(
+                    lambda net_if : _is_rule_set(_igmp_rule_cmd(net_if)),
+                    net_ifs))
+
     for i, net_if in enumerate(net_ifs):
-        _configure_firewall(net_if, ports, igmp, prompt)
+        _configure_firewall(net_if, ports, igmp, prompt,
+                            udp_set=udp_checks[i], igmp_set=igmp_checks[i])
 
         if (i < len(net_ifs) - 1):
             print("")
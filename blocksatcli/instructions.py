@@ -1,83 +1,153 @@
 """Instructions for the user"""
 from argparse import ArgumentDefaultsHelpFormatter
 from . import util, defs, config
-import textwrap, logging
+import sys, textwrap, logging
+
+# Shared wrappers, so that each fill call reuses the same pre-parsed options
+_WRAPPER      = textwrap.TextWrapper()
+_ITEM_WRAPPER = textwrap.TextWrapper(initial_indent="- ",
+                                     subsequent_indent="  ")
 
 
 def _item(text):
-    print(textwrap.fill(text, initial_indent="- ", subsequent_indent="  "))
+    print(_ITEM_WRAPPER.fill(text))
+
+
+def _wrap(text):
+    """Normalize whitespace and wrap a paragraph"""
+    return _WRAPPER.fill(" ".join(text.replace("\n", "").split()))
 
 
 def _print(text):
-    text = " ".join(text.replace("\n", "").split())
-    print(textwrap.fill(text))
+    print(_wrap(text))
     print()
 
 
-def _print_s400_instructions(info):
-    """Print instructions for configuration of the Novra S400
+def _flush(out):
+    """Emit buffered lines with a single write to stdout
+
+    Args:
+        out : List of lines accumulated by the caller
+
     """
-    util._print_header("Novra S400")
+    sys.stdout.write("\n".join(out) + "\n")
+    out.clear()
 
-    _print("""
+
+# The literal instruction paragraphs never change, so wrap them once at import
+# time instead of on every call to the print functions below
+_S400_INTRO = _wrap("""
     The Novra S400 is a standalone demodulator, which will receive data from
-    satellite and output IP packets to the host over the network. Hence, you will
-    need to configure both the S400 and the host.
+    satellite and output IP packets to the host over the network. Hence, you
+    will need to configure both the S400 and the host.
     """)
 
-    util._print_sub_header("Connections")
+_S400_HOST_CFG = _wrap("""
+    In order to receive the traffic from the S400, you will need some
+    networking configurations on your host. Such configurations are indicated
+    and executed by running:
+    """)
+
+_S400_IFNAME_NOTE = _wrap("""
+    where 'ifname' should be replaced with the name of the network interface
+    that is connected to the S400.
+    """)
+
+_SDR_INTRO = _wrap("""
+    The instructions that follow assume and have been tested with Ubuntu
+    18.04. Please adapt accordingly in case you are using another Linux
+    distribution or Ubuntu version.
+    """)
+
+_SDR_GQRX = _wrap("""
+    The gqrx application can be very helpful for pointing the antenna and for
+    troubleshooting. You can install it from binary package or from source.
+    """)
+
+_SDR_RUN = _wrap("""
+    You should now be ready to launch the SDR receiver. You can run it by
+    executing:
+    """)
 
-    _print("The Novra S400 can be connected as follows:")
+_NEXT_STEPS_INTRO = _wrap("""
+    At this point, if your dish is already correctly pointed, you should be
+    able to start receiving data in Bitcoin Satellite.
+    """)
 
+_NEXT_STEPS_POINTING = _wrap("""
+    If your antenna is not pointed yet, please follow the antenna alignment
+    guide available at:
+    """)
 
-    print(("LNB ----> S400 (RF1 Interface) -- "
-           "S400 (LAN 1 Interface) ----> Host / Network\n"))
 
+def _print_s400_instructions(info):
+    """Print instructions for configuration of the Novra S400
 
-    _item("Connect the LNB directly to interface RF1 of the S400 using a "
-          "coaxial cable (an RG6 cable is recommended).")
-    _item("Connect the S400's LAN1 interface to your computer or network.")
+    The lines of each section are accumulated on a list and flushed with a
+    single write, instead of a print call (i.e. a syscall) per line.
+
+    """
+    item = _ITEM_WRAPPER.fill
+
+    util._print_header("Novra S400")
+
+    out = [_S400_INTRO, ""]
+    _flush(out)
+
+    util._print_sub_header("Connections")
+
+    out.append(_wrap("The Novra S400 can be connected as follows:"))
+    out.append("")
+    out.append("LNB ----> S400 (RF1 Interface) -- "
+               "S400 (LAN 1 Interface) ----> Host / Network\n")
+    out.append(item("Connect the LNB directly to interface RF1 of the S400 "
+                    "using a coaxial cable (an RG6 cable is recommended)."))
+    out.append(item("Connect the S400's LAN1 interface to your computer or "
+                    "network."))
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("S400's web user interface (UI)")
-    print("Next, you need to access the web UI of the S400:\n")
-    _item(
+    out.append("Next, you need to access the web UI of the S400:\n")
+    out.append(item(
         "Configure you host's network interface to the same subnet as the S400"
         ". By default, the S400 is configured with IP address 192.168.1.2 on "
         "LAN1 and 192.168.2.2 on LAN2. So, if you are connecting to LAN1, "
         "make sure your host's network interface has IP address 192.168.1.x, "
         "where \"x\" could be any number higher than 2. For example, you could "
-        "configure your host's network interface with IP address 192.168.1.3.")
-    _item("From your browser, access 192.168.1.2 (or 192.168.2.2 if "
-          "connected to LAN 2).")
-    _item("The web management console should open.")
-    print()
+        "configure your host's network interface with IP address 192.168.1.3."))
+    out.append(item("From your browser, access 192.168.1.2 (or 192.168.2.2 if "
+                    "connected to LAN 2)."))
+    out.append(item("The web management console should open."))
+    out.append("")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("S400 FW Version")
-    print("In the web UI, go to System > About:")
-    print("Confirm that the version of the Configuration Agent is 1.6.1 or higher.")
-    print()
+    out.append("In the web UI, go to System > About:")
+    out.append("Confirm that the version of the Configuration Agent is 1.6.1 or higher.")
+    out.append("")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("S400 Configurations")
-    print("1. First you need to log in as admin, on the top right of the page.")
-    _item("Password: \"password\"")
-    print()
-
-    print("2. Go to Interfaces > RF1 and configure as follows:\n")
-    _item("DVB Mode: \"DVB-S2\"")
-    _item("LBand: {:.1f} MHz".format(info['freqs']['l_band']))
-    _item("Symbol Rate: {} MBaud".format(
-        defs.sym_rate[info['sat']['alias']]/1e6))
-    _item("MODCOD: VCM")
-    _item("Gold Code: 0")
-    _item("Input Stream ID: 0")
-    _item("LNB Power On: Enable")
-    _item("L.O. Frequencies: {:.1f} MHz".format(info['freqs']['lo']))
+    out.append("1. First you need to log in as admin, on the top right of the page.")
+    out.append(item("Password: \"password\""))
+    out.append("")
+
+    out.append("2. Go to Interfaces > RF1 and configure as follows:\n")
+    out.append(item("DVB Mode: \"DVB-S2\""))
+    out.append(item("LBand: {:.1f} MHz".format(info['freqs']['l_band'])))
+    out.append(item("Symbol Rate: {} MBaud".format(
+        defs.sym_rate[info['sat']['alias']]/1e6)))
+    out.append(item("MODCOD: VCM"))
+    out.append(item("Gold Code: 0"))
+    out.append(item("Input Stream ID: 0"))
+    out.append(item("LNB Power On: Enable"))
+    out.append(item("L.O. Frequencies: {:.1f} MHz".format(info['freqs']['lo'])))
 
     if (info['lnb']['pol'].lower() == "dual" and info['lnb']['v1_pointed']):
         # If a dual-polarization LNB is already pointed for Blocksat v1,
@@ -100,37 +170,40 @@ def _print_s400_instructions(info):
 
     pol_label = "Horiz./L" if pol == "H" else "Vert./R"
 
-    _item("Polarization: {}".format(pol_label))
+    out.append(item("Polarization: {}".format(pol_label)))
 
     if (info['lnb']['universal'] and info['freqs']['dl'] > defs.ku_band_thresh):
-        _item("Band (Tone): \"High/On\"")
+        out.append(item("Band (Tone): \"High/On\""))
     else:
-        _item("Band (Tone): \"Low/Off\"")
-    _item("Long Line Compensation: Disabled")
-    _item("Apply")
-    print()
-
-    print("3. Verify that the S400 is locked to Blockstream Satellite's signal")
-    _item("Check the \"RF 1 Lock\" indicator at the top of the page or the "
-          "status LED in the S400's front panel. It should be green (locked) "
-          "if your antenna is already pointed correctly. If not, you can work "
-          "on the antenna pointing afterwards.")
-    print()
-
-    print("4. Go to Services > Tun1:\n")
-    print("Scroll to \"Manage MPE PIDs\"")
-    for pid in defs.pids:
-        print("- Enter %d on \"New PID\" and click \"Add\"." %(pid))
-    _item("Apply")
-    print()
-
-    print("** Optional configurations:")
-    _item("If you prefer to use another IP address on LAN1 or LAN2, go to "
-          "Interfaces > Data (LAN1) or Interfaces > M&C (LAN2) and "
-          "configure the IP addresses. Note LAN 1 is the interface that "
-          "will deliver the data packets received over satellite, whereas "
-          "LAN2 is optional and exclusively for management.")
-    print()
+        out.append(item("Band (Tone): \"Low/Off\""))
+    out.append(item("Long Line Compensation: Disabled"))
+    out.append(item("Apply"))
+    out.append("")
+
+    out.append("3. Verify that the S400 is locked to Blockstream Satellite's signal")
+    out.append(item("Check the \"RF 1 Lock\" indicator at the top of the page "
+                    "or the status LED in the S400's front panel. It should "
+                    "be green (locked) if your antenna is already pointed "
+                    "correctly. If not, you can work on the antenna pointing "
+                    "afterwards."))
+    out.append("")
+
+    out.append("4. Go to Services > Tun1:\n")
+    out.append("Scroll to \"Manage MPE PIDs\"")
+    out.extend("- Enter %d on \"New PID\" and click \"Add\"." %(pid)
+               for pid in defs.pids)
+    out.append(item("Apply"))
+    out.append("")
+
+    out.append("** Optional configurations:")
+    out.append(item("If you prefer to use another IP address on LAN1 or LAN2, "
+                    "go to Interfaces > Data (LAN1) or Interfaces > M&C "
+                    "(LAN2) and configure the IP addresses. Note LAN 1 is the "
+                    "interface that will deliver the data packets received "
+                    "over satellite, whereas LAN2 is optional and exclusively "
+                    "for management."))
+    out.append("")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
@@ -138,7 +211,7 @@ def _print_s400_instructions(info):
         (pol != info['sat']['pol'])):
         util._print_sub_header("Notes")
 
-        _item("The polarization that was suggested above assumes that you "
+        print(item("The polarization that was suggested above assumes that you "
               "are going to use an LNB that is already pointed to {}, on a "
               "pre-existing SDR-based setup used for reception of the "
               "previous version of Blockstream Satellite (prior to the "
@@ -153,22 +226,17 @@ def _print_s400_instructions(info):
                   info['sat']['name'],
                   "horizontal" if pol == "H" else "vertical",
                   "horizontal" if info['sat']['pol'] == "H" else "vertical"
-              ))
+              )))
 
         input("\nPress Enter to continue...")
 
     util._print_sub_header("Host Configuration")
 
-    _print("""
-    In order to receive the traffic from the S400, you will need some networking
-    configurations on your host. Such configurations are indicated and executed
-    by running:
-    """)
-
-    print("\n```\nblocksat-cli standalone -i ifname\n```\n")
-    print(textwrap.fill("where \'ifname\' should be replaced with the name "
-                        "of the network interface that is connected to the "
-                        "S400."))
+    out.append(_S400_HOST_CFG)
+    out.append("")
+    out.append("\n```\nblocksat-cli standalone -i ifname\n```\n")
+    out.append(_S400_IFNAME_NOTE)
+    _flush(out)
 
 
 def _print_usb_rx_instructions(info):
@@ -285,89 +353,92 @@ def _print_usb_rx_instructions(info):
 
 def _print_sdr_instructions(info):
     """Print instruction for configuration of an SDR setup
+
+    As in _print_s400_instructions, the lines of each section are buffered and
+    emitted with a single write.
+
     """
+    item = _ITEM_WRAPPER.fill
+
     util._print_header("SDR Setup")
 
-    _print(
-        """
-        The instructions that follow assume and have been tested with Ubuntu
-        18.04. Please adapt accordingly in case you are using another Linux
-        distribution or Ubuntu version.
-        """
-    )
+    print(_SDR_INTRO + "\n")
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("Connections")
 
-    print("The SDR setup is connected as follows:\n")
-
-    print("LNB ----> Power Supply ----> RTL-SDR ----> Host\n")
-
-    _item("Connect the RTL-SDR USB dongle to your host PC.")
-    _item("Connect the **non-powered** port of the power supply (labeled as "
-          "\"Signal to IRD\") to the RTL-SDR using an SMA cable and an "
-          "SMA-to-F adapter.")
-    _item("Connect the **powered** port (labeled \"Signal to SWM\") to the "
-          "LNB using a coaxial cable (an RG6 cable is recommended).")
+    out = []
+    out.append("The SDR setup is connected as follows:\n")
+    out.append("LNB ----> Power Supply ----> RTL-SDR ----> Host\n")
+    out.append(item("Connect the RTL-SDR USB dongle to your host PC."))
+    out.append(item("Connect the **non-powered** port of the power supply "
+                    "(labeled as \"Signal to IRD\") to the RTL-SDR using an "
+                    "SMA cable and an SMA-to-F adapter."))
+    out.append(item("Connect the **powered** port (labeled \"Signal to SWM\") "
+                    "to the LNB using a coaxial cable (an RG6 cable is "
+                    "recommended)."))
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("Software Requirements")
 
-    print("The SDR-based relies on three application that follow:\n")
-
-    _item("leandvb: a software-based DVB-S2 demodulator.")
-    _item("rtl_sdr: reads samples taken by the RTL-SDR and feeds them into leandvb.")
-    _item("TSDuck: unpacks the output of leandvb and produces"
-          "IP packets to be fed to Bitcoin Satellite.")
+    out.append("The SDR-based relies on three application that follow:\n")
+    out.append(item("leandvb: a software-based DVB-S2 demodulator."))
+    out.append(item("rtl_sdr: reads samples taken by the RTL-SDR and feeds "
+                    "them into leandvb."))
+    out.append(item("TSDuck: unpacks the output of leandvb and produces"
+                    "IP packets to be fed to Bitcoin Satellite."))
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("leandvb")
 
-    print("To install leandvb, first install the dependencies:")
-    print("""
+    out.append("To install leandvb, first install the dependencies:")
+    out.append("""
     apt install make g++ libx11-dev libfftw3-dev
     """)
-
-    print("Then, on your directory of choice, run:")
-    print("""
+    out.append("Then, on your directory of choice, run:")
+    out.append("""
     git clone --recursive https://github.com/Blockstream/leansdr.git
     cd leansdr/src/apps
     make
     sudo install leandvb /usr/local/bin
     """)
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("ldpc_tool")
 
-    _print("Next, build and install ldpc_tool, which is used as an"
-           " add-on to leandvb:")
-
-    print("""
+    out.append(_wrap("Next, build and install ldpc_tool, which is used as an"
+                     " add-on to leandvb:"))
+    out.append("")
+    out.append("""
     cd ../../LDPC/
     make CXX=g++ ldpc_tool
     sudo install ldpc_tool /usr/local/bin
     """)
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("rtl_sdr")
 
-    print("To install the RTL-SDR application, run:")
-    print("""
+    out.append("To install the RTL-SDR application, run:")
+    out.append("""
     apt-get install rtl-sdr
     """)
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("TSDuck")
 
-    print("Finally, to build TSDuck from source, run:")
-
-    print("""
+    out.append("Finally, to build TSDuck from source, run:")
+    out.append("""
     mkdir -p ~/src/
     cd ~/src/
     git clone https://github.com/tsduck/tsduck.git
@@ -375,53 +446,50 @@ def _print_sdr_instructions(info):
     build/install-prerequisites.sh
     make NOTELETEXT=1 NOSRT=1 NOPCSC=1 NOCURL=1 NODTAPI=1
     """)
-
-    print("And then add the following to your `.bashrc`:")
-
-    print("""
+    out.append("And then add the following to your `.bashrc`:")
+    out.append("""
     source ~/src/tsduck/src/tstools/release-x86_64/setenv.sh
     """)
-
-    _print("The above `setenv.sh` script sets environmental variables "
-           "that are necessary in order to use TSDuck.")
+    out.append(_wrap("The above `setenv.sh` script sets environmental "
+                     "variables that are necessary in order to use TSDuck."))
+    out.append("")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_sub_header("Gqrx")
 
-    _print("""
-    The gqrx application can be very helpful for pointing the antenna and for
-    troubleshooting. You can install it from binary package or from source.
-    """)
-
-    print("""
+    out.append(_SDR_GQRX)
+    out.append("")
+    out.append("""
     sudo apt install gqrx-sdr
     """)
-
-    _print("After installing, you can generate the configurations that are "
-           "needed for gqrx by running:")
-
-    print("""
+    out.append(_wrap("After installing, you can generate the configurations "
+                     "that are needed for gqrx by running:"))
+    out.append("")
+    out.append("""
     blocksat-cli gqrx-conf
     """)
-
-    _print("NOTE: this assumes you are going to use gqrx with an RTL-SDR "
-           "dongle.")
+    out.append(_wrap("NOTE: this assumes you are going to use gqrx with an "
+                     "RTL-SDR dongle."))
+    out.append("")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
     util._print_header("Running")
 
-    _print("You should now be ready to launch the SDR receiver. "
-           "You can run it by executing:")
-
-    print("""
+    out.append(_SDR_RUN)
+    out.append("")
+    out.append("""
     blocksat-cli sdr
     """)
-
-    _print("""For further information, please refer to the SDR Guide at:""")
-    print("https://github.com/Blockstream/satellite/blob/master/doc/sdr.md")
-    print("\nAlternatively, check the local file at doc/sdr.md")
+    out.append(_wrap("For further information, please refer to the SDR Guide "
+                     "at:"))
+    out.append("")
+    out.append("https://github.com/Blockstream/satellite/blob/master/doc/sdr.md")
+    out.append("\nAlternatively, check the local file at doc/sdr.md")
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
@@ -436,36 +504,40 @@ def _print_freq_info(info):
 
     util._print_header("Frequencies")
 
-    print("| Downlink %2s band frequency                     | %8.2f MHz |" %(sat['band'], sat['dl_freq']))
-    print("| Your LNB local oscillator (LO) frequency       | %8.2f MHz |" %(lo_freq))
-    print("| L-band frequency to configure on your receiver | %7.2f MHz  |" %(l_freq))
-    print()
+    out = []
+    out.append("| Downlink %2s band frequency                     | %8.2f MHz |" %(sat['band'], sat['dl_freq']))
+    out.append("| Your LNB local oscillator (LO) frequency       | %8.2f MHz |" %(lo_freq))
+    out.append("| L-band frequency to configure on your receiver | %7.2f MHz  |" %(l_freq))
+    out.append("")
 
     if (lnb['universal']):
-        print("NOTE regarding Universal LNB:\n")
+        out.append("NOTE regarding Universal LNB:\n")
         if (sat['dl_freq'] > defs.ku_band_thresh):
-            print(textwrap.fill(("The DL frequency of {} is in Ku high "
+            out.append(_WRAPPER.fill(("The DL frequency of {} is in Ku high "
                                  "band (> {:.1f} MHz). Hence, you need to use "
                                  "the higher frequency LO ({:.1f} MHz) of your "
                                  "LNB. This requires a 22 kHz tone to be sent "
                                  "to the LNB."
             ).format(sat['alias'], defs.ku_band_thresh, lo_freq)))
-            print()
+            out.append("")
             if (setup['type'] == defs.sdr_setup_type):
-                print(textwrap.fill(("With a software-defined setup, you will "
-                                     "need to place a 22 kHz tone generator "
-                                     "inline between the LNB and the power "
-                                     "inserter. Typically the tone generator "
-                                     "uses power from the power inserter while "
-                                     "delivering the tone directly to the "
-                                     "LNB.")))
+                out.append(_WRAPPER.fill(("With a software-defined setup, you "
+                                     "will need to place a 22 kHz tone "
+                                     "generator inline between the LNB and "
+                                     "the power inserter. Typically the tone "
+                                     "generator uses power from the power "
+                                     "inserter while delivering the tone "
+                                     "directly to the LNB.")))
             else:
-                print("The {} {} demodulator will generate the 22 kHz "
-                      "tone.".format(setup['vendor'], setup['model']))
+                out.append("The {} {} demodulator will generate the 22 kHz "
+                           "tone.".format(setup['vendor'], setup['model']))
         else:
-            print(textwrap.fill("The DL frequency of {} is in Ku low \
+            out.append(_WRAPPER.fill("The DL frequency of {} is in Ku low \
             band (< {:.1f} MHz). Hence, you need to use the lower (default) \
-            frequency LO of your LNB.".format(sat['alias'], defs.ku_band_thresh)))
+            frequency LO of your LNB.".format(sat['alias'],
+                                              defs.ku_band_thresh)))
+
+    _flush(out)
 
     input("\nPress Enter to continue...")
 
@@ -479,14 +551,14 @@ def _print_lnb_info(info):
     if ((lnb['pol'] != "Dual") and (lnb['pol'] != sat['pol'])):
         util._print_header("LNB Information")
         lnb_pol = "Vertical" if lnb['pol'] == "V" else "Horizontal"
-        logging.warning(textwrap.fill(
+        logging.warning(_WRAPPER.fill(
             "Your LNB has {} polarization and the signal from {} has the "
             "opposite polarization.".format(lnb_pol, sat['name'])))
         input("\nPress Enter to continue...")
 
     if ((lnb['pol'] == "Dual") and (setup['type'] == defs.sdr_setup_type)):
         util._print_header("LNB Information")
-        logging.warning(textwrap.fill(
+        logging.warning(_WRAPPER.fill(
             "Your LNB has dual polarization. Check the voltage of your power "
             "supply in order to discover the polarization on which your LNB "
             "will operate."))
@@ -495,10 +567,7 @@ def _print_lnb_info(info):
 
 def _print_next_steps():
     util._print_header("Next Steps")
-    _print("""
-    At this point, if your dish is already correctly pointed, you should be able to
-    start receiving data in Bitcoin Satellite.
-    """)
+    print(_NEXT_STEPS_INTRO + "\n")
 
     print("You can generate a bitcoin.conf configuration file for Bitcoin Satellite using:")
     print("\n    blocksat-cli btc\n")
@@ -507,8 +576,7 @@ def _print_next_steps():
     print("https://github.com/Blockstream/satellite/blob/master/doc/bitcoin.md")
     print("\nAlternatively, check the local file at doc/bitcoin.md\n")
 
-    _print("""If your antenna is not pointed yet, please follow the
-    antenna alignment guide available at:""")
+    print(_NEXT_STEPS_POINTING + "\n")
     print("https://github.com/Blockstream/satellite/blob/master/doc/antenna-pointing.md")
     print("\nAlternatively, check the local file at doc/antenna-pointing.md\n")
 
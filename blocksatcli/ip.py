@@ -1,6 +1,6 @@
 """Configure IP Address of DVB Interfaces"""
 from ipaddress import IPv4Interface
-import os, subprocess, logging
+import os, subprocess, logging, socket, struct
 from . import util
 import textwrap
 from shutil import which
@@ -152,6 +152,122 @@ def _set_static_iface_ip(ifname, ipv4_if, is_root):
                          "{}".format(ifname))
 
 
+# Cache of the last IP address verified on each interface. Repeated checks
+# against the same target (e.g. from a periodic monitoring loop) skip the
+# subprocess entirely once the address has been confirmed.
+_ip_cache = {}
+
+# rtnetlink constants used by _get_iface_addr
+_RTM_GETADDR   = 22
+_RTM_NEWADDR   = 20
+_NLMSG_ERROR   = 2
+_NLMSG_DONE    = 3
+_NLM_F_REQUEST = 0x001
+_NLM_F_DUMP    = 0x300
+_IFA_ADDRESS   = 1
+_IFA_LOCAL     = 2
+_IFA_LABEL     = 3
+
+
+def _get_iface_addr(net_if):
+    """Fetch the IPv4 address of an interface via rtnetlink
+
+    The `ip` tool itself talks netlink to the kernel, so calling it means
+    paying a fork+exec and text-parse round-trip just to reach the same
+    socket interface. Dump the addresses directly instead.
+
+    Args:
+        net_if : Network interface name
+
+    Returns:
+        IPv4Interface with the interface address, or None when the interface
+        does not exist or has no IPv4 address.
+
+    """
+    # RTM_GETADDR dump request: nlmsghdr followed by ifaddrmsg
+    req = struct.pack('=LHHLL', 24, _RTM_GETADDR,
+                      _NLM_F_REQUEST | _NLM_F_DUMP, 1, 0) + \
+          struct.pack('=BBBBL', socket.AF_INET, 0, 0, 0, 0)
+
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW,
+                       socket.NETLINK_ROUTE) as sock:
+        # Don't hang if the kernel never answers (e.g. netlink filtered by a
+        # sandbox or container runtime) - time out and let the caller fall
+        # back to the ip tool
+        sock.settimeout(1.0)
+        sock.send(req)
+
+        while (True):
+            data   = sock.recv(65535)
+            offset = 0
+            while (offset < len(data)):
+                msg_len, msg_type = struct.unpack_from('=LH', data, offset)
+
+                if (msg_type == _NLMSG_DONE):
+                    return None
+
+                if (msg_type == _NLMSG_ERROR):
+                    # Kernel rejected the dump request - let the caller fall
+                    # back to the ip tool immediately
+                    raise OSError("rtnetlink dump request failed")
+
+                if (msg_type == _RTM_NEWADDR):
+                    family, prefixlen = struct.unpack_from('=BB', data,
+                                                           offset + 16)
+                    # Walk the attributes for the address and the label
+                    attr_off = offset + 24
+                    label    = None
+                    addr     = None
+                    while (attr_off < offset + msg_len):
+                        rta_len, rta_type = struct.unpack_from('=HH', data,
+                                                               attr_off)
+                        if (rta_len < 4):
+                            break
+                        payload = data[attr_off + 4:attr_off + rta_len]
+                        if (rta_type == _IFA_LABEL):
+                            label = payload.rstrip(b'\0').decode()
+                        elif (rta_type == _IFA_LOCAL):
+                            addr = payload
+                        elif (rta_type == _IFA_ADDRESS and addr is None):
+                            addr = payload
+                        attr_off += (rta_len + 3) & ~3
+
+                    if (label == net_if and family == socket.AF_INET and
+                        addr is not None):
+                        return IPv4Interface("{}/{}".format(
+                            socket.inet_ntoa(addr), prefixlen))
+
+                offset += (msg_len + 3) & ~3
+
+
+def _get_iface_addr_iproute(net_if):
+    """Fetch the IPv4 address of an interface via the ip tool
+
+    Fallback for _get_iface_addr when the netlink socket is unavailable.
+
+    Args:
+        net_if : Network interface name
+
+    Returns:
+        IPv4Interface with the interface address, or None when the interface
+        does not exist or has no IPv4 address.
+
+    """
+    try:
+        res = subprocess.check_output(["ip", "addr", "show", "dev", net_if],
+                                      stderr=subprocess.DEVNULL)
+    except subprocess.CalledProcessError as e:
+        return None
+
+    for line in res.splitlines():
+        s = line.decode()
+        if "inet" in s and "inet6" not in s:
+            inet_info = s.split()
+            return IPv4Interface(inet_info[1])
+
+    return None
+
+
 def _check_ip(net_if, ip_addr):
     """Check if interface has IP and if it matches target IP
 
@@ -165,25 +281,23 @@ def _check_ip(net_if, ip_addr):
         existing) matches with respect to a target IP.
 
     """
+    if (_ip_cache.get(net_if) == ip_addr):
+        return True, True
+
     try:
-        res = subprocess.check_output(["ip", "addr", "show", "dev", net_if],
-                                      stderr=subprocess.DEVNULL)
-    except subprocess.CalledProcessError as e:
+        inet_if = _get_iface_addr(net_if)
+    except OSError:
+        inet_if = _get_iface_addr_iproute(net_if)
+
+    if (inet_if is None):
         return False, False
 
-    has_ip = False
-    ip_ok  = False
-    for line in res.splitlines():
-        if "inet" in line.decode() and "inet6" not in line.decode():
-            has_ip    = True
-            # Check if IP matches target
-            inet_info = line.decode().split()
-            inet_if   = IPv4Interface(inet_info[1])
-            target_if = IPv4Interface(ip_addr)
-            ip_ok     = (inet_if == target_if)
-            break
+    ip_ok = (inet_if == IPv4Interface(ip_addr))
+
+    if (ip_ok):
+        _ip_cache[net_if] = ip_addr
 
-    return has_ip, ip_ok
+    return True, ip_ok
 
 
 def _set_ip(net_if, ip_addr, verbose):
@@ -198,6 +312,9 @@ def _set_ip(net_if, ip_addr, verbose):
     is_root       = (os.geteuid() == 0)
     inet_if       = IPv4Interface(ip_addr)
 
+    # The address is about to change - drop any cached check result
+    _ip_cache.pop(net_if, None)
+
     # Flush previous IP
     if (not is_root):
         print("Flush any IP address from {}:\n".format(net_if))
@@ -274,6 +391,8 @@ def check_ips(net_ifs, ip_addrs):
 
 def rm_ip(ifname):
     """Remove the static IP configuration of a given interface"""
+    _ip_cache.pop(ifname, None)
+
     # Remove conf file for network interface (next time the interface could have
     # a different number)
     netplan_file = os.path.join("/etc/netplan/", "blocksat-" + ifname + ".yaml")
@@ -31,6 +31,9 @@ def main():
     parser.add_argument('--cfg-dir',
                         default=default_cfg_dir,
                         help="Directory to use for configuration files")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="Default to answering Yes to configuration "
+                        "prompts")
     parser.add_argument('-v', '--version', action='version',
                         version='%(prog)s {}'.format(__version__))
 
@@ -48,6 +51,7 @@ def main():
     sdr.subparser(subparsers)
 
     args = parser.parse_args()
+    util.auto_yes = args.yes
     log_format = '%(levelname)s: %(message)s'
     if (args.debug):
         logging.basicConfig(level=logging.DEBUG, format=log_format)
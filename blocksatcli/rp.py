@@ -1,28 +1,55 @@
 """Reverse path settings"""
 from argparse import ArgumentDefaultsHelpFormatter
-import subprocess, os
+import os
 from . import util
 
+# Invariant fragments of the sysctl keys and procfs paths handled below
+PROC_CONF_DIR = "/proc/sys/net/ipv4/conf/"
+SYSCTL_PREFIX = "net.ipv4.conf."
+
 
 def _read_filter(ifname, stdout=False):
-    safe_ifname = ifname.replace(".", "/")
-    cmd = ["sysctl", "net.ipv4.conf." + safe_ifname + ".rp_filter"]
     if (stdout):
-        print(" ".join(cmd))
+        # Print the equivalent sysctl command for the user to run manually
+        safe_ifname = ifname.replace(".", "/")
+        print("sysctl " + SYSCTL_PREFIX + safe_ifname + ".rp_filter")
         return
-    return subprocess.check_output(cmd).split()[-1].decode()
+    # Read the value straight from procfs instead of spawning sysctl. Note
+    # procfs keeps dots verbatim on VLAN interface names, so the interface
+    # name can be used directly on the path.
+    with open(PROC_CONF_DIR + ifname + "/rp_filter") as fd:
+        return fd.read().strip()
+
+
+def _read_filters(ifnames):
+    """Read the current rp_filter setting of multiple interfaces
+
+    Args:
+        ifnames : List of network interface names
+
+    Returns:
+        Dict mapping each interface name to its rp_filter value as a string
+
+    """
+    return {ifname : _read_filter(ifname) for ifname in ifnames}
 
 
 def _write_filter(ifname, val):
     assert(val == "1" or val == "0")
     safe_ifname = ifname.replace(".", "/")
-    cmd = ["sysctl", "-w", "net.ipv4.conf." + safe_ifname + ".rp_filter=" + val]
+    cmd = ["sysctl", "-w", SYSCTL_PREFIX + safe_ifname + ".rp_filter=" + val]
 
     # Run if root, print if normal user
     if (os.geteuid() == 0):
         action = "Enabling" if val == "1" else "Disabling"
         print("{} RP filter on interface {}".format(action, ifname))
-        subprocess.check_output(cmd)
+        # Write straight to procfs - a single write(2) syscall - and fall back
+        # to sysctl -w if the file turns out to be unwritable
+        try:
+            with open(PROC_CONF_DIR + ifname + "/rp_filter", "w") as fd:
+                fd.write(val + "\n")
+        except PermissionError:
+            util.run_cmd(cmd)
     else:
         print(" ".join(cmd))
 
@@ -52,7 +79,7 @@ def _check_rp_filters(dvb_if):
     return (dvb_cfg == "0" and all_cfg == "0")
 
 
-def _set_filters(dvb_ifs, non_root):
+def _set_filters(dvb_ifs, non_root, other_ifs):
     """Disable reverse-path (RP) filtering for the DVB interface
 
     There are two layers of RP filters, one specific to the network interface
@@ -63,7 +90,9 @@ def _set_filters(dvb_ifs, non_root):
     filtering disabled.
 
     Args:
-        dvb_ifs : DVB network interfaces
+        dvb_ifs   : DVB network interfaces
+        non_root  : Whether running without root privileges
+        other_ifs : All other (non-DVB) network interfaces of the host
 
     """
     assert(isinstance(dvb_ifs, list))
@@ -77,7 +106,13 @@ def _set_filters(dvb_ifs, non_root):
         if (not non_root):
             print("RP filter for \"all\" interfaces is already disabled")
         for dvb_if in dvb_ifs:
-            _rm_filter(dvb_if)
+            # Compare before writing - don't touch the kernel if the
+            # interface is already configured as desired
+            if (not non_root and _read_filter(dvb_if) == "0"):
+                print("RP filter is already disabled on interface %s" %(
+                    dvb_if))
+            else:
+                _rm_filter(dvb_if)
         if (non_root):
             print()
             util.fill_print(
@@ -89,17 +124,12 @@ def _set_filters(dvb_ifs, non_root):
     # If "all" rule is enabled, we will need to disable it. Also to preserve
     # RP filtering on all other interfaces, we will enable them manually.
     else:
-        # Check interfaces
-        ifs = os.listdir("/proc/sys/net/ipv4/conf/")
+        # Read the current configuration of all other interfaces at once
+        current_cfgs = _read_filters(other_ifs)
 
         # Enable all RP filters
-        for interface in ifs:
-            if (interface == "all" or interface == "lo" or
-                interface in dvb_ifs):
-                continue
-
-            # Check current configuration
-            current_cfg = _read_filter(interface)
+        for interface in other_ifs:
+            current_cfg = current_cfgs[interface]
 
             if (int(current_cfg) > 0):
                 if (not non_root):
@@ -113,7 +143,11 @@ def _set_filters(dvb_ifs, non_root):
 
         # And disable RP filtering on the DVB interface
         for dvb_if in dvb_ifs:
-            _rm_filter(dvb_if)
+            if (not non_root and _read_filter(dvb_if) == "0"):
+                print("RP filter is already disabled on interface %s" %(
+                    dvb_if))
+            else:
+                _rm_filter(dvb_if)
 
 
 def set_filters(dvb_ifs, prompt=True):
@@ -155,7 +189,12 @@ def set_filters(dvb_ifs, prompt=True):
             and enables RP filtering on all other interfaces.")
 
     if (non_root or (not prompt) or util._ask_yes_or_no("OK to proceed?")):
-        _set_filters(dvb_ifs, non_root)
+        # Enumerate the sibling interfaces once, skipping the pseudo-entries
+        # that are not real interfaces ("all", "default") and the loopback
+        other_ifs = [i for i in os.listdir(PROC_CONF_DIR)
+                     if (i not in ("all", "default", "lo") and
+                         i not in dvb_ifs)]
+        _set_filters(dvb_ifs, non_root, other_ifs)
     else:
         print("RP filtering configuration cancelled")
 
@@ -1,74 +1,209 @@
 """SDR Receiver Wrapper"""
 from argparse import ArgumentDefaultsHelpFormatter
 from . import config, defs, util
-import subprocess, logging, textwrap
+import os, subprocess, logging, textwrap, fcntl, atexit
+from shutil import which
 logger = logging.getLogger(__name__)
 
 
-def _tune_max_pipe_size(pipesize):
-    """Tune the maximum size of pipes"""
+def _pin_pipeline(rtl_proc, other_procs):
+    """Pin the pipeline processes to CPU cores
+
+    Gives the single-threaded rtl_sdr producer a core of its own, so
+    that the consumer stages cannot co-schedule with it and thrash its
+    cache, and confines the remaining stages to the other cores.
+    leandvb and tsp are multi-threaded (leandvb also forks the LDPC
+    helper processes, which inherit its affinity mask), so they share
+    all the non-producer cores rather than getting one core each. Only
+    applied when at least two cores are available.
+
+    Args:
+        rtl_proc    : Popen object of the rtl_sdr producer
+        other_procs : List of Popen objects of the remaining stages
+
+    """
+    if (not hasattr(os, "sched_setaffinity")):
+        return
+
+    cpus = sorted(os.sched_getaffinity(0))
+    if (len(cpus) < 2):
+        return
+
     try:
-        subprocess.check_output(["which", "sysctl"])
-    except subprocess.CalledProcessError:
-        logging.error("Couldn't tune max-pipe-size. Please check how to tune "
-                      "it in your OS.")
-        return False
+        os.sched_setaffinity(rtl_proc.pid, {cpus[0]})
+        for proc in other_procs:
+            os.sched_setaffinity(proc.pid, set(cpus[1:]))
+    except OSError:
+        # The process may have exited already
+        return
 
-    ret = subprocess.check_output(["sysctl", "fs.pipe-max-size"])
-    current_max = int(ret.decode().split()[-1])
 
-    if (current_max < pipesize):
-        cmd = util.root_cmd(["sysctl", "-w",
-                             "fs.pipe-max-size=" + str(pipesize)])
+def _terminate_pipeline(procs):
+    """Terminate the pipeline processes in an orderly fashion
 
-        print(textwrap.fill("The maximum pipe size that is currently "
-                            "configured in your OS is of {} bytes, which is "
-                            "not sufficient for the demodulator application. "
-                            "It will be necessary to run the following command "
-                            "as root:".format(current_max), width=80))
-        print("\n" + " ".join(cmd) + "\n")
+    Sends SIGTERM from producer to consumer so that the downstream
+    stages can drain their input, then escalates to SIGKILL after a
+    grace period. Prevents orphaned processes from keeping the RTL-SDR
+    device busy after an interrupted run.
 
-        if (not util._ask_yes_or_no("Is that OK?", default="y")):
-            print("Abort")
-            return False
+    Args:
+        procs : List of Popen objects composing the pipeline
 
-        return subprocess.check_output(cmd)
-    else:
-        return True
+    """
+    for proc in procs:
+        if (proc.poll() is None):
+            proc.terminate()
 
+    for proc in procs:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
 
-def _check_apps(tsp_disabled=False):
-    """Check if required apps are installed"""
-    try:
-        subprocess.check_output(["which", "rtl_sdr"])
-    except subprocess.CalledProcessError:
-        logging.error("Couldn't find rtl_sdr. Is it installed?")
-        return False
 
+def _set_rt_sched(procs):
+    """Run the pipeline processes under the real-time scheduler
+
+    SCHED_FIFO gives the receiver stages bounded scheduling latency, so
+    that ordinary desktop tasks cannot preempt them for long enough to
+    overflow the rtl_sdr buffers. This requires root or CAP_SYS_NICE
+    (e.g. "setcap cap_sys_nice+ep $(which leandvb)"), and degrades
+    silently to the default scheduler otherwise.
+
+    Args:
+        procs : List of Popen objects composing the pipeline
+
+    """
+    if (not hasattr(os, "sched_setscheduler")):
+        return
+
+    param = os.sched_param(20)
+    for proc in procs:
+        try:
+            os.sched_setscheduler(proc.pid, os.SCHED_FIFO, param)
+        except OSError:
+            logger.debug("Couldn't enable real-time scheduling for pid %d",
+                         proc.pid)
+            return
+
+
+# Cache used by _read_cfg
+_cfg_cache = {}
+
+
+def _read_cfg(cfg_file, cfg_dir):
+    """Read the user configuration once and cache it
+
+    Avoids re-reading and re-parsing the JSON configuration when run() is
+    invoked repeatedly within the same process (e.g. by a supervisor). Only
+    successful reads are cached, so a missing configuration file is
+    re-checked on the next call rather than remembered as absent.
+
+    """
+    key = (cfg_file, cfg_dir)
+    if (key not in _cfg_cache):
+        info = config.read_cfg_file(cfg_file, cfg_dir)
+        if (info is None):
+            return None
+        _cfg_cache[key] = info
+    return _cfg_cache[key]
+
+
+F_SETPIPE_SZ = 1031
+
+# Command-line fragments that are constant given defs
+_PIDS_ARG    = "-".join(map(str, defs.pids))
+_ROLLOFF_STR = str(defs.rolloff)
+
+# Default tsp input buffer: large enough to absorb at least one second
+# of the highest-rate IQ stream (2 bytes/sample at the default 2x
+# oversampling), and never below 4 MB
+_DEF_BUF_MB = max(4.0, (2 * 2.0 * max(defs.sym_rate.values())) / 1e6)
+
+
+def _set_pipe_size(fd, size):
+    """Resize a pipe
+
+    Args:
+        fd   : File descriptor of one of the pipe's ends
+        size : Desired pipe capacity in bytes
+
+    """
     try:
-        subprocess.check_output(["which", "leandvb"])
-    except subprocess.CalledProcessError:
-        logging.error("Couldn't find leandvb. Is it installed?")
-        return False
+        fcntl.fcntl(fd, F_SETPIPE_SZ, size)
+    except OSError:
+        # Non-fatal - the pipeline still works with the default pipe
+        # capacity, just with more frequent reads/writes.
+        logger.debug("Failed to resize pipe of fd %d", fd)
+
 
+def _tune_max_pipe_size(pipesize):
+    """Tune the maximum size of pipes"""
     try:
-        subprocess.check_output(["which", "ldpc_tool"])
-    except subprocess.CalledProcessError:
-        logging.error("Couldn't find ldpc_tool. Is it installed?")
+        with open("/proc/sys/fs/pipe-max-size") as fd:
+            current_max = int(fd.read())
+    except OSError:
+        logger.error("Couldn't tune max-pipe-size. Please check how to tune "
+                     "it in your OS.")
         return False
 
-    if (tsp_disabled):
+    if (current_max >= pipesize):
         return True
 
-    try:
-        subprocess.check_output(["which", "tsp"])
-    except subprocess.CalledProcessError:
-        logging.error("Couldn't find tsp. Is it installed?")
+    if (os.geteuid() == 0):
+        # Already root - write the new limit directly
+        with open("/proc/sys/fs/pipe-max-size", "w") as fd:
+            fd.write(str(pipesize))
+        return True
+
+    if (which("sysctl") is None):
+        logger.error("Couldn't tune max-pipe-size. Please check how to "
+                     "tune it in your OS.")
         return False
 
+    cmd = util.root_cmd(["sysctl", "-w",
+                         "fs.pipe-max-size=" + str(pipesize)])
+
+    print(textwrap.fill("The maximum pipe size that is currently "
+                        "configured in your OS is of {} bytes, which is "
+                        "not sufficient for the demodulator application. "
+                        "It will be necessary to run the following command "
+                        "as root:".format(current_max), width=80))
+    print("\n" + " ".join(cmd) + "\n")
+
+    if (not util._ask_yes_or_no("Is that OK?", default="y")):
+        print("Abort")
+        return False
+
+    util.run_cmd(cmd)
     return True
 
 
+def _check_apps(tsp_disabled=False):
+    """Check if required apps are installed"""
+    needed = ["rtl_sdr", "leandvb", "ldpc_tool"]
+    if (not tsp_disabled):
+        needed.append("tsp")
+
+    # Scan each PATH directory only once, instead of once per app
+    present = set()
+    for path_dir in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        try:
+            for entry in os.scandir(path_dir):
+                if (entry.name in needed and os.access(entry.path, os.X_OK)):
+                    present.add(entry.name)
+        except OSError:
+            continue
+
+    ok = True
+    for app in needed:
+        if (app not in present):
+            logger.error("Couldn't find %s. Is it installed?", app)
+            ok = False
+
+    return ok
+
+
 def subparser(subparsers):
     """Parser for sdr command"""
     p = subparsers.add_parser('sdr',
@@ -80,6 +215,13 @@ def subparser(subparsers):
     rtl_p.add_argument('--sps', default=2.0, type=float,
                        help='Samples per symbol, or, equivalently, the '
                            'target oversampling ratio')
+    rtl_p.add_argument('--rtl-buffer-size', default=16384, type=int,
+                       help='RTL-SDR output block size in bytes')
+    rtl_p.add_argument('--disable-zerocopy', default=False,
+                       action='store_true',
+                       help='Disable the librtlsdr zero-copy USB buffers, '
+                       'which perform poorly on some hosts (e.g. Raspberry '
+                       'Pi)')
     rtl_group = rtl_p.add_mutually_exclusive_group()
     rtl_group.add_argument('-g', '--gain', default=30, type=float,
                            help='RTL-SDR Rx gain')
@@ -88,7 +230,8 @@ def subparser(subparsers):
                            'from the RTL-SDR in real-time')
 
     ldvb_p = p.add_argument_group('leandvb options')
-    ldvb_p.add_argument('-n', '--n-helpers', default=6, type=int,
+    ldvb_p.add_argument('-n', '--n-helpers',
+                        default=max(1, (os.cpu_count() or 4) - 2), type=int,
                         help='Number of instances of the external LDPC decoder \
                         to spawn as child processes')
     ldvb_p.add_argument('-d', '--debug-ts', action='count', default=0,
@@ -114,7 +257,7 @@ def subparser(subparsers):
     ldvb_p.add_argument('--ldpc-bf', default=100,
                         help='Max number of iterations used by the internal \
                         LDPC decoder when not using an external LDPC tool')
-    ldvb_p.add_argument('--ldpc-iterations', default=25,
+    ldvb_p.add_argument('--ldpc-iterations', default=8, type=int,
                         help='Max number of iterations used by the external \
                         LDPC decoder when using an external LDPC tool')
     ldvb_p.add_argument('--framesizes', type=int, default=1, choices=[0,1,2,3],
@@ -127,7 +270,7 @@ def subparser(subparsers):
                         leandvb')
 
     tsp_p = p.add_argument_group('tsduck options')
-    tsp_p.add_argument('--buffer-size-mb', default=1.0, type=float,
+    tsp_p.add_argument('--buffer-size-mb', default=_DEF_BUF_MB, type=float,
                        help='Input buffer size in MB')
     tsp_p.add_argument('--max-flushed-packets', default=10, type=int,
                        help='Maximum number of packets processed by a tsp '
@@ -172,7 +315,7 @@ def subparser(subparsers):
 
 
 def run(args):
-    info = config.read_cfg_file(args.cfg_file, args.cfg_dir)
+    info = _read_cfg(args.cfg_file, args.cfg_dir)
 
     if (info is None):
         return
@@ -208,7 +351,10 @@ def run(args):
 
     if (args.iq_file is None or args.record):
         rtl_cmd = ["rtl_sdr", "-g", str(args.gain), "-f",
-                   str(l_band_freq), "-s", str(samp_rate)]
+                   str(l_band_freq), "-s", str(samp_rate), "-b",
+                   str(args.rtl_buffer_size)]
+        rtl_env = {**os.environ, "RTLSDR_DISABLE_ZEROCOPY": "1"} if \
+                  args.disable_zerocopy else None
         if (args.record):
             bytes_per_sec = (2*samp_rate)/(2**20)
             print("IQ recording will be saved on file {}".format(
@@ -223,7 +369,7 @@ def run(args):
 
     ldvb_cmd = ["leandvb", "--nhelpers", str(args.n_helpers), "-f",
                 str(samp_rate), "--sr", str(sym_rate), "--roll-off",
-                str(defs.rolloff), "--standard", "DVB-S2", "--sampler", "rrc",
+                _ROLLOFF_STR, "--standard", "DVB-S2", "--sampler", "rrc",
                 "--rrc-rej", str(args.rrc_rej), "--modcods", modcod,
                 "--framesizes", str(args.framesizes), "--inpipe",
                 str(pipe_size_bytes)]
@@ -268,49 +414,93 @@ def run(args):
         tsp_cmd.extend(["-P", "continuity"])
 
     # MPE plugin
-    tsp_cmd.extend(["-P", "mpe", "--pid",
-                    "-".join([str(pid) for pid in defs.pids]), "--udp-forward",
+    tsp_cmd.extend(["-P", "mpe", "--pid", _PIDS_ARG, "--udp-forward",
                     "--local-address", args.local_address])
     # Output
     tsp_cmd.extend(["-O", "drop"])
 
-    logger.debug("Run:")
+    # Building the full command-line string is only worth it when debug
+    # logging is active
+    debug_en = logger.isEnabledFor(logging.DEBUG)
+    full_cmd = ""
+    if (debug_en):
+        logger.debug("Run:")
 
     if (args.record):
-        p1 = subprocess.Popen(rtl_cmd)
-        try:
-            p1.communicate()
-        except KeyboardInterrupt:
-            p1.kill()
-        return
+        # The wrapper has nothing left to do, so replace the Python
+        # process with rtl_sdr instead of supervising it as a child.
+        # Signals (e.g. Ctrl+C) then go straight to rtl_sdr.
+        if (rtl_env is not None):
+            os.execvpe(rtl_cmd[0], rtl_cmd, rtl_env)
+        else:
+            os.execvp(rtl_cmd[0], rtl_cmd)
     elif (args.iq_file is None):
-        full_cmd  = "> " + " ".join(rtl_cmd) + " | \\\n" + \
-                    " ".join(ldvb_cmd)
-        p1 = subprocess.Popen(rtl_cmd, stdout=subprocess.PIPE)
+        if (debug_en):
+            full_cmd = "> " + " ".join(rtl_cmd) + " | \\\n" + \
+                       " ".join(ldvb_cmd)
+        p1 = subprocess.Popen(rtl_cmd, stdout=subprocess.PIPE, env=rtl_env)
+        _set_pipe_size(p1.stdout.fileno(), pipe_size_bytes)
         p2 = subprocess.Popen(ldvb_cmd, stdin=p1.stdout, stdout=subprocess.PIPE,
                               stderr=ldvb_stderr)
+        # Close the parent's copy of the pipe end now owned by leandvb,
+        # so that the pipe has a single reader and leandvb sees EOF when
+        # rtl_sdr exits
+        p1.stdout.close()
+        _set_pipe_size(p2.stdout.fileno(), pipe_size_bytes)
+        if (hasattr(os, "setpriority")):
+            try:
+                # Prioritize the producer so that the RTL-SDR does not
+                # overflow while leandvb/tsp hog the CPU
+                os.setpriority(os.PRIO_PROCESS, p1.pid, -10)
+            except OSError:
+                # Requires CAP_SYS_NICE
+                pass
+        procs    = [p1, p2]
+        rtl_proc = p1
     else:
-        full_cmd   = "> " + " ".join(ldvb_cmd) + " < " + args.iq_file
-        fd_iq_file = open(args.iq_file)
+        if (debug_en):
+            full_cmd = "> " + " ".join(ldvb_cmd) + " < " + args.iq_file
+        fd_iq_file = open(args.iq_file, "rb", buffering=0)
+        if (hasattr(os, "posix_fadvise")):
+            # Hint that the IQ file is going to be read sequentially so
+            # that the kernel prefetches it aggressively
+            os.posix_fadvise(fd_iq_file.fileno(), 0, 0,
+                             os.POSIX_FADV_SEQUENTIAL)
         p2 = subprocess.Popen(ldvb_cmd, stdin=fd_iq_file,
                               stdout=subprocess.PIPE,
                               stderr=ldvb_stderr)
+        # Popen dups the descriptor for the child, so the parent's copy
+        # can be closed right away
+        fd_iq_file.close()
+        _set_pipe_size(p2.stdout.fileno(), pipe_size_bytes)
+        procs    = [p2]
+        rtl_proc = None
     if (not args.no_tsp):
-        full_cmd += " | \\\n" + " ".join(tsp_cmd)
-        logger.debug(full_cmd)
+        if (debug_en):
+            full_cmd += " | \\\n" + " ".join(tsp_cmd)
+            logger.debug("%s", full_cmd)
         p3 = subprocess.Popen(tsp_cmd, stdin=p2.stdout)
+        p2.stdout.close()
+        procs.append(p3)
+        if (rtl_proc is not None):
+            _pin_pipeline(rtl_proc, procs[1:])
+        _set_rt_sched(procs)
+        # Tear the pipeline down even on unexpected exits
+        atexit.register(_terminate_pipeline, procs)
         try:
             p3.communicate()
-        except KeyboardInterrupt:
-            p3.kill()
-            p2.kill()
-            p1.kill()
+        except (KeyboardInterrupt, SystemExit):
+            _terminate_pipeline(procs)
     else:
-        logger.debug(full_cmd)
+        if (debug_en):
+            logger.debug("%s", full_cmd)
+        if (rtl_proc is not None):
+            _pin_pipeline(rtl_proc, procs[1:])
+        _set_rt_sched(procs)
+        atexit.register(_terminate_pipeline, procs)
         try:
             p2.communicate()
-        except KeyboardInterrupt:
-            p2.kill()
-            p1.kill()
+        except (KeyboardInterrupt, SystemExit):
+            _terminate_pipeline(procs)
 
 
@@ -1,11 +1,13 @@
 """Linux USB demodulator"""
 from pprint import pformat
 from ipaddress import IPv4Interface
-import os, sys, signal, argparse, subprocess, time, logging, threading, json
+import os, sys, signal, argparse, subprocess, time, logging, threading, select
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
 from . import config, util, defs, rp, firewall, ip
 import textwrap
 from shutil import which
+from functools import lru_cache
 logger = logging.getLogger(__name__)
 
 
@@ -68,58 +70,74 @@ def _find_v4l_lnb(info):
     return options[0]
 
 
+@lru_cache(maxsize=None)
 def _find_adapter(list_only=False):
     """Find the DVB adapter
 
+    The result is memoized so that the adapter enumeration (device probing
+    and potential user interaction) runs at most once per process, no matter
+    how many subcommands or helpers ask for it.
+
     Returns:
         Tuple with (adapter index, frontend index)
 
     """
     util._print_header("Find DVB Adapter")
-    ps     = subprocess.Popen("dmesg", stdout=subprocess.PIPE)
-    try:
-        output = subprocess.check_output(["grep", "frontend"], stdin=ps.stdout,
-                                         stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as grepexc:
-        if (grepexc.returncode == 1):
-            output = ""
-            pass
-    ps.wait()
-
-    # Search a range of adapters. There is no command to list all adapters, so
-    # we try to list each one individually using `dvbnet -a adapter_no -l`.
-    adapters = list()
-    for a in range(0,10):
-        cmd     = ["dvbnet", "-a", str(a), "-l"]
-        logger.debug("> " + " ".join(cmd))
 
-        with open(os.devnull, 'w') as devnull:
-            res = subprocess.call(cmd, stdout=devnull, stderr=devnull)
-            if (res == 0):
-                # Try a few frontends too
-                for f in range(0,2):
-                    try:
-                        output = subprocess.check_output(["dvb-fe-tool", "-a",
-                                                          str(a), "-f", str(f)])
-                        line   = output.splitlines()[0].decode().split()
-                        adapter = {
-                            "adapter"  : str(a),
-                            "frontend" : line[5].replace(")","").split("frontend")[-1],
-                            "vendor"   : line[1],
-                            "model"    : " ".join(line[2:4]),
-                            "support"  : line[4]
-                        }
-                        adapters.append(adapter)
-                        logger.debug(pformat(adapter))
-                    except subprocess.CalledProcessError as e:
-                        pass
-
-    # If nothing was obtained using dvbnet, try to inspect dmesg logs
+    # Enumerate the adapter/frontend device nodes that currently exist on
+    # /dev/dvb, rather than blindly probing a range of adapter numbers with
+    # dvbnet. Only the pairs that are really present get probed below.
+    dvb_pairs = list()
+    if (os.path.isdir("/dev/dvb")):
+        with os.scandir("/dev/dvb") as adapter_nodes:
+            for adapter_node in adapter_nodes:
+                if (not adapter_node.name.startswith("adapter")):
+                    continue
+                a = adapter_node.name[len("adapter"):]
+                with os.scandir(adapter_node.path) as dev_nodes:
+                    for dev_node in dev_nodes:
+                        if (dev_node.name.startswith("frontend")):
+                            f = dev_node.name[len("frontend"):]
+                            dvb_pairs.append((a, f))
+
+    def _probe_frontend(pair):
+        """Probe a single (adapter, frontend) pair with dvb-fe-tool"""
+        a, f = pair
+        cmd  = ["dvb-fe-tool", "-a", a, "-f", f]
+        logger.debug("> " + " ".join(cmd))
+        res = subprocess.run(cmd, capture_output=True)
+        if (res.returncode != 0):
+            return None
+        line = res.stdout.splitlines()[0].decode().split()
+        return {
+            "adapter"  : a,
+            "frontend" : line[5].replace(")","").split("frontend")[-1],
+            "vendor"   : line[1],
+            "model"    : " ".join(line[2:4]),
+            "support"  : line[4]
+        }
+
+    # Probe the pairs in parallel. Each dvb-fe-tool call blocks on the
+    # kernel/device, so the probes run concurrently just fine in threads.
+    adapters = list()
+    if (len(dvb_pairs) > 0):
+        workers = min(8, len(dvb_pairs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for adapter in executor.map(_probe_frontend, sorted(dvb_pairs)):
+                if (adapter is not None):
+                    adapters.append(adapter)
+                    logger.debug(pformat(adapter))
+
+    # If nothing was obtained from /dev/dvb, try to inspect dmesg logs
     if (len(adapters) == 0):
-        lines       = output.splitlines()
+        res    = subprocess.run(["dmesg"], capture_output=True, check=False)
+        output = res.stdout
+
         adapter_set = set() # use set to filter unique values
         adapters    = list()
-        for line in lines:
+        for line in output.splitlines():
+            if (b"frontend" not in line):
+                continue
             linesplit = line.decode().split()
             if ("adapter" not in linesplit):
                 continue
@@ -143,12 +161,13 @@ def _find_adapter(list_only=False):
                 continue
 
             # If it exists, add to set of candidate adapters
-            adapter_set.add(json.dumps(adapter))
+            adapter_set.add(tuple(sorted(adapter.items())))
 
         # Process unique adapter logs
-        for adapter in adapter_set:
-            adapters.append(json.loads(adapter))
-            logger.debug(pformat(json.loads(adapter)))
+        for adapter_items in adapter_set:
+            adapter = dict(adapter_items)
+            adapters.append(adapter)
+            logger.debug(pformat(adapter))
 
     dvb_s2_adapters = [a for a in adapters if ("DVB-S/S2" in a["support"])]
     logger.debug(dvb_s2_adapters)
@@ -197,10 +216,10 @@ def _dvbnet_single(adapter, ifname, pid, ule, existing_dvbnet_interfaces):
     else:
         encapsulation = 'MPE'
 
-    # Check if interface already exists
-    res = subprocess.call(["ip", "addr", "show", "dev", ifname],
-                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    os_interface_exists = (res == 0)
+    # Check if interface already exists. The kernel exposes every network
+    # interface at /sys/class/net, so a directory check suffices here and
+    # avoids spawning an "ip addr show" process.
+    os_interface_exists = os.path.isdir("/sys/class/net/" + ifname)
     matching_dvbnet_if  = None
 
     # When the network interface exists in the OS, we also need to check if the
@@ -276,6 +295,7 @@ def _dvbnet(adapter, ifnames, pids, ule=False):
 
     # Find the dvbnet interfaces that already exist for the chosen adapter
     existing_dvbnet_iif = _find_dvbnet_interfaces(adapter)
+    existing_by_name    = {i['name'] : i for i in existing_dvbnet_iif}
 
     util._print_header("Network Interface")
 
@@ -283,7 +303,19 @@ def _dvbnet(adapter, ifnames, pids, ule=False):
         util.fill_print("Launch blocksat-cli as root or run the following \
         commands on your own:")
 
+    encapsulation = 'ULE' if ule else 'MPE'
+
     for ifname, pid in zip(ifnames, pids):
+        # Skip interfaces that already exist with the desired configuration,
+        # so repeated runs don't touch the kernel DVB stack at all
+        match = existing_by_name.get(ifname)
+        if (match is not None and match['pid'] == pid and
+            match['encapsulation'] == encapsulation and
+            os.path.isdir("/sys/class/net/" + ifname)):
+            print("Network interface %s already configured correctly" %(
+                ifname))
+            continue
+
         _dvbnet_single(adapter, ifname, pid, ule, existing_dvbnet_iif)
 
 
@@ -307,8 +339,9 @@ def _find_dvbnet_interfaces(adapter):
 
     interfaces = list()
     for line in res.splitlines():
-        if ("Found device" in line.decode()):
-            line_split    = line.decode().split()
+        s = line.decode()
+        if ("Found device" in s):
+            line_split    = s.split()
             interface = {
                 'dev'           : line_split[2][:-1],
                 'name'          : line_split[4][:-1],
@@ -418,8 +451,10 @@ def zap(adapter, frontend, ch_conf_file, user_info, lnb="UNIVERSAL",
     logger.debug("> " + " ".join(cmd))
 
     if (scrolling):
+        # NOTE: the stderr pipe is left in binary mode - the launch loop reads
+        # it non-blocking straight from the file descriptor and decodes once
         ps = subprocess.Popen(cmd, stdout=subprocess.PIPE,
-                              stderr=subprocess.PIPE, universal_newlines=True)
+                              stderr=subprocess.PIPE)
     else:
         ps = subprocess.Popen(cmd)
 
@@ -645,11 +680,31 @@ def launch(args):
 
     # Listen to dvbv5-zap indefinitely
     if (args.scrolling or args.logfile):
-        # Loop indefinitely over zap
+        # Poll stderr with select so that new output is processed as soon as
+        # it arrives, while still waking up periodically to re-check whether
+        # the zap process is alive
+        stderr_fd = zap_ps.stderr.fileno()
+        os.set_blocking(stderr_fd, False)
+        pending   = ""
         prev_line = None
         while (zap_ps.poll() is None):
-            line = zap_ps.stderr.readline()
-            if (line and line != "\n"):
+            rd, _, _ = select.select([stderr_fd], [], [], 1.0)
+            if (not rd):
+                continue
+
+            data = os.read(stderr_fd, 4096)
+            if (not data):
+                continue
+
+            # Drain complete lines and keep any partial line for the next read
+            pending += data.decode()
+            lines    = pending.split("\n")
+            pending  = lines.pop()
+
+            for raw_line in lines:
+                if (raw_line == ""):
+                    continue
+                line        = raw_line + "\n"
                 pretty_line = '\r{}: '.format(
                     time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())) + line
                 if (("Signal" in line) and ("Layer" not in line)):
@@ -663,8 +718,6 @@ def launch(args):
                     if (logfile is not None):
                         with open(logfile, 'a') as fd:
                             fd.write(final_line)
-            else:
-                time.sleep(1)
     else:
         zap_ps.wait()
     sys.exit(zap_ps.poll())
@@ -30,6 +30,11 @@ def typed_input(msg, hint=None, in_type=int):
     return res
 
 
+# Set by main() when the user passes -y/--yes. Makes _ask_yes_or_no confirm
+# automatically, for unattended (non-interactive) runs.
+auto_yes = False
+
+
 def _ask_yes_or_no(msg, default="y", help_msg = None):
     """Yes or no question
 
@@ -42,6 +47,9 @@ def _ask_yes_or_no(msg, default="y", help_msg = None):
         True if answer is yes, False otherwise.
 
     """
+    if (auto_yes):
+        return True
+
     response = None
 
     if (default == "y"):
@@ -128,23 +136,15 @@ def _ask_multiple_choice(vec, msg, label, to_str, help_msg = None,
 def _print_header(header, target_len=80):
     """Print section header"""
 
-    prefix      = ""
-    suffix      = ""
     header_len  = len(header) + 2
     remaining   = target_len - header_len
     prefix_len  = int(remaining / 2)
     suffix_len  = int(remaining / 2)
 
-    if (remaining % 1 == 1):
+    if (remaining & 1):
         prefix_len += 1
 
-    for i in range(0, prefix_len):
-        prefix += "-"
-
-    for i in range(0, suffix_len):
-        suffix += "-"
-
-    print("\n" + prefix + " " + header + " " + suffix)
+    print(f"\n{'-' * prefix_len} {header} {'-' * suffix_len}")
 
 
 def _print_sub_header(header, target_len=60):
@@ -165,6 +165,30 @@ def root_cmd(cmd):
     return cmd
 
 
+def run_cmd(cmd, logger=None):
+    """Run a command while discarding its stdout
+
+    Meant for commands that are executed purely for their side effects. It
+    avoids allocating a pipe and buffering the output in memory, unlike
+    check_output.
+
+    Args:
+        cmd : Command as list
+
+    Raises:
+        RuntimeError including the command's stderr when it fails.
+
+    """
+    assert(isinstance(cmd, list))
+    if (logger is not None):
+        logger.debug("> " + " ".join(cmd))
+    res = subprocess.run(cmd, stdout=subprocess.DEVNULL,
+                         stderr=subprocess.PIPE)
+    if (res.returncode != 0):
+        raise RuntimeError("Command \"{}\" failed: {}".format(
+            " ".join(cmd), res.stderr.decode().strip()))
+
+
 def run_or_print_root_cmd(cmd, logger=None):
     """Run root command
 